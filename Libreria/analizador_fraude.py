@@ -7,6 +7,44 @@ import hashlib
 from datetime import datetime
 import re
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from libreria.config import FRAUDE
+from libreria.paginas_documento import PaginasDocumento
+from libreria.caracteristicas_pagina import CaracteristicasPagina
+from libreria.firmas_sellos import detectar_firmas_sellos
+from libreria.copia_movimiento import detectar_copia_movimiento
+from libreria.glifos_digitos import extraer_glifos, glifos_atipicos
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool_fraude():
+    """
+    Retorna el pool de hilos de los detectores del AnalizadorFraude, creándolo
+    la primera vez. Lo comparten todos los análisis, así varias solicitudes a la
+    vez no lanzan más hilos que FRAUDE["hilos"] (None = número de núcleos).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            hilos = FRAUDE["hilos"] or os.cpu_count() or 1
+            _pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="fraude")
+        return _pool
+
+
+def _medir(analisis, *args):
+    """
+    Ejecuta un detector y retorna (resultado, inicio, fin) en tiempo de reloj.
+    """
+    inicio = time.perf_counter()
+    resultado = analisis(*args)
+    return resultado, inicio, time.perf_counter()
+
 
 class AnalizadorFraude:
     def __init__(self):
@@ -14,41 +52,183 @@ class AnalizadorFraude:
         self.firmas_verificadas = set()
         self.umbral_riesgo = 0.7
 
-    def analizar_documento_completo(self, archivo_path, texto_extraido):
+    def analizar_documento_completo(self, archivo_path, texto_extraido, paginas=None, presupuesto=None,
+                                    layouts=None):
         """
         Realiza un análisis completo del documento para detectar fraudes.
+
+        Se analizan todas las páginas (PDF de varias páginas incluidos). Cada página
+        se decodifica una sola vez (o se toma de `paginas`, las páginas ya
+        rasterizadas del documento) y sus características (escala de grises,
+        umbrales, componentes) se comparten entre todos los análisis de la página
+        y con el análisis visual. Los análisis de imagen puntúan con la página
+        más sospechosa; las firmas y los dígitos de los montos se evalúan con
+        los de todo el documento. Los dígitos se toman de `layouts`, la lista de
+        LayoutOCR por página de la extracción de texto (sin layout no se revisan).
+
+        Los detectores corren en paralelo en el pool del analizador (ver
+        obtener_pool_fraude): cada página se envía apenas se carga, mientras se
+        rasteriza la siguiente, y nunca hay más de FRAUDE["max_paginas_en_vuelo"]
+        páginas cargadas esperando sus detectores, para acotar la memoria.
+        "tiempos" guarda el tiempo de reloj y el estado de cada detector
+        ("no_aplica" si ninguna página le correspondía, como los dígitos sin
+        layouts, y "error" si falló en alguna página: su alerta lo indica y las
+        demás páginas sí cuentan). Con `presupuesto` (segundos; por defecto
+        FRAUDE["presupuesto_segundos"], None = sin límite) el análisis se corta
+        al agotarlo: los detectores sin terminar quedan "omitido" (o "parcial" si
+        alcanzaron a analizar algunas páginas) y no suman a la puntuación.
         """
+        inicio = time.perf_counter()
+        if presupuesto is None:
+            presupuesto = FRAUDE["presupuesto_segundos"]
+        limite = inicio + presupuesto if presupuesto else None
+        pool = obtener_pool_fraude()
+
+        propias = paginas is None
+        if propias:
+            paginas = PaginasDocumento(archivo_path)
+
         resultados = {
             "puntuacion_riesgo": 0,
             "alertas": [],
             "detalles": {},
-            "recomendaciones": []
+            "recomendaciones": [],
+            "tiempos": {}
+        }
+
+        # 2, 3 y 5. Análisis por página: manipulación de imagen, patrones de
+        # impresión y calidad y autenticidad. 4 y 6. Las firmas y los dígitos de
+        # los montos se extraen por página y se comparan en conjunto. Se envían
+        # de los más rápidos a los más lentos, así con poco presupuesto terminan
+        # los más detectores posibles
+        analisis_por_pagina = {
+            "patrones": self.analizar_patrones_impresion,
+            "calidad": self.analizar_calidad_autenticidad,
+            "firmas": self.detectar_firmas,
+            "glifos": self.extraer_glifos,
+            "manipulacion": self.detectar_manipulacion_imagen
         }
+        layouts = layouts or []
+
+        def aplica(clave, indice):
+            # Los dígitos de los montos solo se revisan en las páginas con layout
+            return clave != "glifos" or (indice < len(layouts) and layouts[indice] is not None)
 
         # 1. Análisis de consistencia de datos
-        consistencia = self.analizar_consistencia_datos(texto_extraido)
+        tareas = {"consistencia": [(None, pool.submit(_medir, self.analizar_consistencia_datos, texto_extraido))]}
+        tareas.update({clave: [] for clave in analisis_por_pagina})
+        try:
+            try:
+                numero_paginas = len(paginas)
+            except Exception as e:
+                numero_paginas = 0
+                resultados["alertas"].append(f"No se pudo leer el documento: {str(e)}")
+            max_en_vuelo = max(1, FRAUDE["max_paginas_en_vuelo"])
+            en_vuelo = deque()
+            siguiente = 0
+            while siguiente < numero_paginas:
+                if len(en_vuelo) >= max_en_vuelo:
+                    # Antes de cargar otra página se espera a la más antigua en vuelo
+                    wait(en_vuelo.popleft(), timeout=max(0.0, limite - time.perf_counter()) if limite else None)
+                if limite and time.perf_counter() >= limite:
+                    break
+                indice = siguiente
+                siguiente += 1
+                try:
+                    pagina = paginas.caracteristicas(indice)
+                except Exception as e:
+                    resultados["alertas"].append(f"No se pudo cargar la página {indice + 1}: {str(e)}")
+                    continue
+                if pagina is None:
+                    resultados["alertas"].append(f"No se pudo cargar la página {indice + 1}")
+                    continue
+                futuros_pagina = []
+                for clave, analisis in analisis_por_pagina.items():
+                    if not aplica(clave, indice):
+                        continue
+                    argumentos = (pagina, layouts[indice]) if clave == "glifos" else (pagina,)
+                    futuro = pool.submit(_medir, analisis, *argumentos)
+                    tareas[clave].append((indice + 1, futuro))
+                    futuros_pagina.append(futuro)
+                en_vuelo.append(futuros_pagina)
+
+            futuros = [futuro for lista in tareas.values() for _, futuro in lista]
+            wait(futuros, timeout=max(0.0, limite - time.perf_counter()) if limite else None)
+        finally:
+            if propias:
+                paginas.liberar()
+
+        terminados = {}
+        for clave, lista in tareas.items():
+            terminados[clave] = []
+            fallidas = 0
+            for numero, futuro in lista:
+                # Las tareas que no empezaron se cancelan; las que están corriendo
+                # terminan en el pool, pero su resultado ya no se usa
+                if not futuro.done() or futuro.cancelled():
+                    futuro.cancel()
+                    continue
+                # La excepción de un detector no debe cortar el análisis de los demás
+                error = futuro.exception()
+                if error is None:
+                    terminados[clave].append((numero, futuro.result()))
+                    continue
+                fallidas += 1
+                pagina_error = f" (página {numero})" if numero else ""
+                resultados["alertas"].append(f"Error en el análisis {clave}{pagina_error}: {str(error)}")
+            # Tiempo de reloj del detector: desde que empezó su primera página
+            # hasta que terminó la última
+            intervalos = [(ini, fin) for _, (_, ini, fin) in terminados[clave]]
+            segundos = max(fin for _, fin in intervalos) - min(ini for ini, _ in intervalos) if intervalos else 0.0
+            omitidas = len(lista) - len(terminados[clave]) - fallidas
+            if clave in analisis_por_pagina:
+                omitidas += sum(aplica(clave, indice) for indice in range(siguiente, numero_paginas))
+            if fallidas:
+                estado = "error"
+            elif not lista and not omitidas:
+                estado = "no_aplica"
+            else:
+                estado = "completo" if not omitidas else "parcial" if terminados[clave] else "omitido"
+            resultados["tiempos"][clave] = {"segundos": round(segundos, 4), "estado": estado}
+        resultados["tiempos"]["total"] = {"segundos": round(time.perf_counter() - inicio, 4)}
+
+        if terminados["consistencia"]:
+            consistencia = terminados["consistencia"][0][1][0]
+        else:
+            consistencia = {"puntuacion": 0, "alertas": [], "detalles": {}}
         resultados["detalles"]["consistencia"] = consistencia
         resultados["puntuacion_riesgo"] += consistencia["puntuacion"]
 
-        # 2. Análisis de manipulación de imagen
-        manipulacion = self.detectar_manipulacion_imagen(archivo_path)
-        resultados["detalles"]["manipulacion"] = manipulacion
-        resultados["puntuacion_riesgo"] += manipulacion["puntuacion"]
-
-        # 3. Análisis de patrones de impresión
-        patrones = self.analizar_patrones_impresion(archivo_path)
-        resultados["detalles"]["patrones"] = patrones
-        resultados["puntuacion_riesgo"] += patrones["puntuacion"]
+        for clave in ("manipulacion", "patrones"):
+            resultados["detalles"][clave] = self._combinar_paginas(
+                [(numero, resultado) for numero, (resultado, _, _) in terminados[clave]]
+            )
+            resultados["puntuacion_riesgo"] += resultados["detalles"][clave]["puntuacion"]
 
-        # 4. Verificación de firmas
-        firmas = self.verificar_firmas(archivo_path)
+        firmas = self.verificar_firmas(
+            firmas_detectadas=[f for _, (firmas, _, _) in terminados["firmas"] for f in firmas]
+        ) if terminados["firmas"] else self._combinar_paginas([])
         resultados["detalles"]["firmas"] = firmas
         resultados["puntuacion_riesgo"] += firmas["puntuacion"]
 
-        # 5. Análisis de calidad y autenticidad
-        calidad = self.analizar_calidad_autenticidad(archivo_path)
-        resultados["detalles"]["calidad"] = calidad
-        resultados["puntuacion_riesgo"] += calidad["puntuacion"]
+        resultados["detalles"]["calidad"] = self._combinar_paginas(
+            [(numero, resultado) for numero, (resultado, _, _) in terminados["calidad"]]
+        )
+        resultados["puntuacion_riesgo"] += resultados["detalles"]["calidad"]["puntuacion"]
+
+        resultados["detalles"]["glifos"] = self.verificar_glifos(
+            [(numero, glifos) for numero, (glifos, _, _) in terminados["glifos"]]
+        )
+        resultados["puntuacion_riesgo"] += resultados["detalles"]["glifos"]["puntuacion"]
+
+        incompletos = [
+            f"{clave} {tiempo['estado']}" for clave, tiempo in resultados["tiempos"].items()
+            if tiempo.get("estado") in ("omitido", "parcial")
+        ]
+        if incompletos:
+            resultados["alertas"].append(
+                f"Análisis incompleto por tiempo ({presupuesto} s): {', '.join(incompletos)}"
+            )
 
         # Normalizar puntuación
         resultados["puntuacion_riesgo"] = min(1.0, resultados["puntuacion_riesgo"] / 5.0)
@@ -58,6 +238,40 @@ class AnalizadorFraude:
 
         return resultados
 
+    def _combinar_paginas(self, resultados_por_pagina):
+        """
+        Combina el resultado de un análisis en varias páginas: puntúa con la página
+        más sospechosa (cuyos detalles se conservan), une las alertas sin repetir
+        y agrega la puntuación de cada página.
+        """
+        if not resultados_por_pagina:
+            return {"puntuacion": 0, "alertas": [], "detalles": {}}
+        if len(resultados_por_pagina) == 1:
+            return resultados_por_pagina[0][1]
+        numero, peor = max(resultados_por_pagina, key=lambda r: r[1]["puntuacion"])
+        alertas = []
+        for _, resultado in resultados_por_pagina:
+            alertas.extend(a for a in resultado["alertas"] if a not in alertas)
+        return {
+            "puntuacion": peor["puntuacion"],
+            "alertas": alertas,
+            "detalles": {
+                **peor["detalles"],
+                "pagina": numero,
+                "puntuacion_por_pagina": {n: r["puntuacion"] for n, r in resultados_por_pagina}
+            }
+        }
+
+    def _caracteristicas(self, imagen):
+        """
+        Retorna las CaracteristicasPagina de la imagen. Acepta una ruta, un arreglo
+        ya cargado o las características ya creadas. Retorna None si no se pudo cargar.
+        """
+        if imagen is None or isinstance(imagen, CaracteristicasPagina):
+            return imagen
+        img = imagen if isinstance(imagen, np.ndarray) else cv2.imread(imagen)
+        return CaracteristicasPagina(img) if img is not None else None
+
     def analizar_consistencia_datos(self, texto):
         """
         Analiza la consistencia de los datos en el documento.
@@ -109,7 +323,7 @@ class AnalizadorFraude:
 
         try:
             # Cargar imagen
-            img = cv2.imread(imagen_path)
+            img = self._caracteristicas(imagen_path)
             if img is None:
                 return resultados
 
@@ -134,90 +348,393 @@ class AnalizadorFraude:
                 resultados["alertas"].append("Patrones de compresión inconsistentes")
                 resultados["puntuacion"] += 0.2
 
+            # 4. Regiones copiadas dentro de la página
+            copia_result = self.analizar_copia_movimiento(img)
+            resultados["detalles"]["copia_movimiento"] = copia_result
+            if copia_result["sospechoso"]:
+                resultados["alertas"].append("Se detectaron regiones copiadas dentro de la página")
+                resultados["puntuacion"] += 0.3
+
         except Exception as e:
             resultados["alertas"].append(f"Error en análisis de manipulación: {str(e)}")
 
         return resultados
 
-    def analizar_ela(self, img):
+    def analizar_ela(self, img, calidades=None):
         """
         Realiza Error Level Analysis para detectar manipulaciones.
+
+        La imagen se recomprime en memoria (cv2.imencode/imdecode, sin archivos
+        temporales) con cada calidad JPEG de `calidades`, de mayor a menor, y se
+        mide la diferencia con la original. La media y la desviación con la
+        primera calidad deciden "sospechoso" como antes.
+
+        El mapa por regiones no usa el error de una sola calidad, que depende
+        sobre todo del contenido (el texto siempre tiene más error que el
+        fondo), sino cuánto crece el error de una calidad a la siguiente (ver
+        _resumir_ela). Una región que ya pasó por una compresión más fuerte,
+        como un pegado de otro JPEG, casi no pierde más al bajar la calidad, así
+        que su error crece menos que en las regiones con la misma textura.
         """
         try:
-            # Guardar imagen temporalmente con calidad específica
-            temp_path = "temp_ela.jpg"
-            cv2.imwrite(temp_path, img, [cv2.IMWRITE_JPEG_QUALITY, 90])
-            
-            # Cargar imagen comprimida
-            compressed = cv2.imread(temp_path)
-            
-            # Calcular diferencia
-            diff = cv2.absdiff(img, compressed)
-            
-            # Analizar patrones en la diferencia
-            mean_diff = np.mean(diff)
-            std_diff = np.std(diff)
-            
-            # Limpiar archivo temporal
-            os.remove(temp_path)
-            
+            pagina = self._caracteristicas(img)
+            img = pagina.imagen
+            calidades = sorted(calidades or FRAUDE["ela_calidades"], reverse=True)
+            cuadricula = FRAUDE["ela_cuadricula"]
+
+            niveles = []
+            errores = []
+            for calidad in calidades:
+                # Recomprimir en memoria con la calidad indicada
+                ok, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, int(calidad)])
+                if not ok:
+                    raise ValueError(f"No se pudo codificar la imagen con calidad {calidad}")
+                compressed = cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+
+                # Calcular diferencia (sobre todos los canales, como siempre)
+                diff = cv2.absdiff(img, compressed)
+                niveles.append({
+                    "calidad": int(calidad),
+                    "mean_diff": float(np.mean(diff)),
+                    "std_diff": float(np.std(diff))
+                })
+                # El mapa por regiones usa el promedio de los canales
+                error = diff.mean(axis=2, dtype=np.float32) if diff.ndim == 3 else diff
+                errores.append(self._mapa_regiones(error, cuadricula))
+            textura = self._mapa_regiones(np.abs(cv2.Laplacian(pagina.gris, cv2.CV_32F)), cuadricula)
+
+            mean_diff = niveles[0]["mean_diff"]
+            std_diff = niveles[0]["std_diff"]
             return {
                 "sospechoso": mean_diff > 10 or std_diff > 5,
                 "mean_diff": mean_diff,
-                "std_diff": std_diff
+                "std_diff": std_diff,
+                "niveles": niveles,
+                "regiones": self._resumir_ela(errores, textura)
             }
         except:
             return {"sospechoso": False}
 
-    def analizar_ruido(self, img):
+    def _mapa_regiones(self, mapa, cuadricula):
+        """
+        Promedio de `mapa` en cada celda de una cuadrícula de `cuadricula` x `cuadricula`.
+        """
+        return cv2.resize(
+            np.asarray(mapa, dtype=np.float32), (cuadricula, cuadricula), interpolation=cv2.INTER_AREA
+        )
+
+    def _resumir_ela(self, errores, textura):
+        """
+        Resume los mapas de error por regiones de cada calidad (de mayor a menor).
+
+        Para cada par de calidades consecutivas se toma el crecimiento del error
+        de cada región, (error a la calidad menor + piso) / (error a la mayor +
+        piso), y se divide por la mediana del crecimiento de las regiones con
+        textura parecida (entre la mitad y el doble de su laplaciano medio): así
+        una región de texto solo se compara con otras de texto y una de fondo
+        con otras de fondo. El mapa es el menor de esos valores relativos (1 es
+        lo normal de la página) y son atípicas las regiones que quedan por
+        debajo de FRAUDE["ela_umbral_region"]. Las regiones lisas (menos del 10 %
+        de la textura máxima) no tienen error que comparar y quedan en None.
+        """
+        piso = FRAUDE["ela_piso"]
+        tex = textura.ravel()
+        # Cada región con contenido es par de sí misma, así ninguna queda sin referencia
+        filas = np.flatnonzero(tex >= 0.1 * tex.max())
+        similares = (tex[None, :] >= tex[filas, None] / 2) & (tex[None, :] <= tex[filas, None] * 2)
+        similares[:, np.setdiff1d(np.arange(len(tex)), filas)] = False
+        relativo = np.full(len(tex), np.nan, dtype=np.float32)
+        if len(errores) > 1 and len(filas):
+            relativo[filas] = np.inf
+            for mayor, menor in zip(errores, errores[1:]):
+                crecimiento = ((menor + piso) / (mayor + piso)).ravel()
+                referencia = np.nanmedian(np.where(similares, crecimiento[None, :], np.nan), axis=1)
+                relativo[filas] = np.fmin(relativo[filas], crecimiento[filas] / referencia)
+        mapa = relativo.reshape(textura.shape)
+        if np.isnan(mapa).all():
+            return {"mapa": [], "region_minima": None, "regiones_atipicas": []}
+        with np.errstate(invalid="ignore"):
+            atipicas = np.argwhere(mapa < FRAUDE["ela_umbral_region"])
+        fila, columna = np.unravel_index(int(np.nanargmin(mapa)), mapa.shape)
+        return {
+            "mapa": [[None if np.isnan(x) else round(float(x), 3) for x in f] for f in mapa],
+            "region_minima": [int(fila), int(columna)],
+            "regiones_atipicas": atipicas.tolist()
+        }
+
+    def analizar_ruido(self, img, modo=None):
         """
         Analiza patrones de ruido en la imagen.
+
+        Con modo "teselas" (el de FRAUDE["ruido_modo"] por defecto) se estima la
+        desviación del ruido de cada tesela de la página con el estimador de
+        Immerkær (un filtro laplaciano de 3x3 que anula las zonas lisas y las
+        rampas), ignorando la tinta y su entorno, que no son ruido. Un
+        pegado de otra fuente suele traer un ruido distinto al del resto de la
+        página, así que se marcan las teselas cuyo ruido se aleja de la mediana
+        (hacia arriba o hacia abajo, en proporción y en niveles de gris) y
+        cualquier tesela atípica hace el resultado "sospechoso".
+
+        El modo "profundo" es el análisis anterior, con fastNlMeansDenoising
+        sobre toda la página: mucho más lento, para revisiones puntuales.
         """
         try:
-            # Convertir a escala de grises
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Aplicar filtro de ruido
-            denoised = cv2.fastNlMeansDenoising(gray)
-            
-            # Calcular diferencia
-            diff = cv2.absdiff(gray, denoised)
-            
-            # Analizar patrones
-            mean_noise = np.mean(diff)
-            std_noise = np.std(diff)
-            
+            pagina = self._caracteristicas(img)
+            gray = pagina.gris
+            modo = modo or FRAUDE["ruido_modo"]
+
+            if modo == "profundo":
+                # Aplicar filtro de ruido
+                denoised = cv2.fastNlMeansDenoising(gray)
+
+                # Calcular diferencia
+                diff = cv2.absdiff(gray, denoised)
+
+                # Analizar patrones
+                mean_noise = np.mean(diff)
+                std_noise = np.std(diff)
+
+                return {
+                    "sospechoso": std_noise > 20,
+                    "modo": modo,
+                    "mean_noise": mean_noise,
+                    "std_noise": std_noise
+                }
+
+            mapa = self._mapa_ruido(pagina, FRAUDE["ruido_tesela"])
+            validas = mapa[~np.isnan(mapa)]
+            if not len(validas):
+                return {"sospechoso": False, "modo": modo}
+
+            # Cada tesela se compara con la mediana en ambos sentidos (un pegado puede
+            # traer más o menos ruido). El piso evita que las teselas casi sin ruido
+            # (fondo de un JPEG o de un PDF digital) conviertan cualquier diferencia
+            # pequeña en una gran proporción; la diferencia mínima en niveles de gris
+            # evita lo mismo con los halos de compresión junto a la tinta.
+            piso = FRAUDE["ruido_piso"]
+            mediana = float(np.median(validas))
+            razon = (mapa + piso) / (mediana + piso)
+            with np.errstate(invalid="ignore"):
+                desvio = np.fmax(razon, 1 / razon)
+                atipicas = np.argwhere(
+                    (desvio > FRAUDE["ruido_umbral_tesela"])
+                    & (np.abs(mapa - mediana) > FRAUDE["ruido_diferencia_min"])
+                )
+            inconsistencia = float(np.nanmax(desvio))
             return {
-                "sospechoso": std_noise > 20,
-                "mean_noise": mean_noise,
-                "std_noise": std_noise
+                "sospechoso": bool(len(atipicas)),
+                "modo": modo,
+                "mean_noise": float(np.mean(validas)),
+                "std_noise": float(np.std(validas)),
+                "inconsistencia": inconsistencia,
+                "tesela": FRAUDE["ruido_tesela"],
+                "mapa": [[None if np.isnan(v) else round(float(v), 3) for v in fila] for fila in mapa],
+                "teselas_atipicas": atipicas.tolist()
             }
         except:
             return {"sospechoso": False}
 
+    def _mapa_ruido(self, pagina, tesela):
+        """
+        Desviación estimada del ruido (Immerkær, 1996) en cada tesela de
+        `tesela` x `tesela` píxeles de la página (CaracteristicasPagina). No
+        cuentan la tinta (umbral fijo) ni su entorno, donde los bordes del texto
+        y los halos de la compresión no son ruido; la máscara sale de la tinta y
+        no del gradiente, porque en una región muy ruidosa el propio ruido
+        supera cualquier umbral de gradiente y la región quedaría sin medir. Las
+        teselas con menos de la mitad de píxeles útiles quedan en NaN.
+        """
+        gray = np.float32(pagina.gris)
+        kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+        respuesta = np.abs(cv2.filter2D(gray, -1, kernel, borderType=cv2.BORDER_REFLECT))
+        lado = FRAUDE["ruido_margen_tinta"]
+        util = np.float32(cv2.dilate(pagina.umbral_fijo, np.ones((lado, lado), np.uint8)) == 0)
+
+        filas, columnas = gray.shape[0] // tesela, gray.shape[1] // tesela
+        if not filas or not columnas:
+            return np.full((1, 1), np.nan, dtype=np.float32)
+        forma = (filas, tesela, columnas, tesela)
+        recorte = (slice(0, filas * tesela), slice(0, columnas * tesela))
+        suma = (respuesta * util)[recorte].reshape(forma).sum(axis=(1, 3))
+        cuenta = util[recorte].reshape(forma).sum(axis=(1, 3))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sigma = np.sqrt(np.pi / 2) * suma / (6 * cuenta)
+        sigma[cuenta < tesela * tesela / 2] = np.nan
+        return sigma
+
+    def analizar_copia_movimiento(self, img):
+        """
+        Busca regiones copiadas y pegadas dentro de la página, como una cifra o un
+        sello duplicados (ver detectar_copia_movimiento). Los pares de regiones
+        quedan en "pares" para mostrarlos en el reporte.
+        """
+        try:
+            resultado = detectar_copia_movimiento(self._caracteristicas(img))
+            return {"sospechoso": bool(resultado["pares"]), **resultado}
+        except:
+            return {"sospechoso": False}
+
     def analizar_compresion(self, img):
         """
         Analiza patrones de compresión en la imagen.
+
+        La página se divide en los bloques de 8x8 de JPEG y se calcula la DCT de
+        todos los bloques a la vez (dos productos matriciales); los bloques con
+        algún canal saturado no se usan. Para cada
+        frecuencia baja se estima el paso de cuantización de la página (el
+        mayor paso en cuya retícula cae casi todo coeficiente no nulo) y con él
+        se arman dos mapas por regiones:
+
+        - desajuste: distancia media de los coeficientes a la retícula. Una
+          región pegada después de la última compresión no cae en ella.
+        - doble_compresion: proporción de coeficientes que caen en los huecos
+          del histograma de valores cuantizados. Si la página se comprimió dos
+          veces el histograma tiene huecos periódicos, y una región que solo
+          pasó por la última compresión no los respeta.
+
+        Las regiones que se alejan de la mediana de la página deciden
+        "sospechoso". Si la página no muestra cuantización JPEG alineada con la
+        cuadrícula de 8x8 (un PNG, o un PDF rasterizado con otra escala) el
+        análisis no aplica y no se marca nada.
         """
         try:
-            # Convertir a escala de grises
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Aplicar DCT
-            dct = cv2.dct(np.float32(gray))
-            
-            # Analizar coeficientes DCT
-            dct_mean = np.mean(np.abs(dct))
-            dct_std = np.std(dct)
-            
-            return {
-                "sospechoso": dct_std > 100,
-                "dct_mean": dct_mean,
-                "dct_std": dct_std
+            pagina = self._caracteristicas(img)
+            gray = pagina.gris
+            coeficientes = self._dct_bloques(gray)
+            ac = coeficientes.reshape(-1, 64)[:, 1:]
+
+            # Los bloques con algún canal cerca de 0 o 255 se recortaron al
+            # descomprimir y sus coeficientes ya no caen en la retícula de cuantización
+            filas, columnas = coeficientes.shape[:2]
+            minimo, maximo = gray, gray
+            if pagina.imagen.ndim == 3:
+                canales = cv2.split(pagina.imagen)
+                minimo = cv2.min(cv2.min(canales[0], canales[1]), canales[2])
+                maximo = cv2.max(cv2.max(canales[0], canales[1]), canales[2])
+            margen = FRAUDE["compresion_margen"]
+            minimo = minimo[:filas * 8, :columnas * 8].reshape(filas, 8, columnas, 8).min(axis=(1, 3))
+            maximo = maximo[:filas * 8, :columnas * 8].reshape(filas, 8, columnas, 8).max(axis=(1, 3))
+            utiles = (minimo >= margen) & (maximo <= 255 - margen)
+
+            resultado = {
+                "sospechoso": False,
+                "dct_mean": float(np.mean(np.abs(ac))),
+                "dct_std": float(np.std(ac)),
+                "jpeg": False
             }
+            forma = coeficientes.shape[:2]
+            suma_desajuste = np.zeros(forma, np.float32)
+            cuenta_desajuste = np.zeros(forma, np.float32)
+            suma_huecos = np.zeros(forma, np.float32)
+            cuenta_huecos = np.zeros(forma, np.float32)
+            pasos = {}
+            limite = FRAUDE["compresion_valor_max"]
+            for u, v in FRAUDE["compresion_frecuencias"]:
+                c = np.where(utiles, coeficientes[:, :, u, v], 0)
+                paso = self._paso_cuantizacion(c[utiles])
+                pasos[f"{u},{v}"] = paso
+                if paso < 3:
+                    continue
+                cociente = c / paso
+                n = np.rint(cociente)
+                no_nulo = np.abs(c) > paso / 2
+                suma_desajuste += np.abs(cociente - n) * no_nulo
+                cuenta_desajuste += no_nulo
+
+                # Huecos del histograma de valores cuantizados: valores casi vacíos
+                # entre vecinos poblados. Con una sola compresión el histograma
+                # decae suave y no los tiene; con dos, los valores que la primera
+                # compresión no podía producir quedan vacíos, salvo en las regiones
+                # que solo pasaron por la última.
+                en_rango = (n != 0) & (np.abs(n) < limite)
+                indices = (n + limite).astype(np.intp)
+                histograma = np.bincount(indices[en_rango], minlength=2 * limite + 1).astype(np.float32)
+                vecinos = np.convolve(histograma, [0.5, 0, 0.5], mode="same")
+                huecos = (histograma < 0.1 * vecinos) & (vecinos >= FRAUDE["compresion_poblacion_min"])
+                if not huecos.any():
+                    continue
+                indices[~en_rango] = limite
+                validos = en_rango & ((histograma >= FRAUDE["compresion_poblacion_min"]) | huecos)[indices]
+                suma_huecos += huecos[indices] & validos
+                cuenta_huecos += validos
+
+            resultado["pasos_cuantizacion"] = pasos
+            if not cuenta_desajuste.any():
+                return resultado
+
+            cuadricula = FRAUDE["compresion_cuadricula"]
+            desajuste = self._promedio_regiones(suma_desajuste, cuenta_desajuste, cuadricula)
+            huecos = self._promedio_regiones(suma_huecos, cuenta_huecos, cuadricula)
+            atipicas_desajuste = self._regiones_desviadas(desajuste, FRAUDE["compresion_desvio_desajuste"], 1)
+            atipicas_huecos = self._regiones_desviadas(huecos, FRAUDE["compresion_desvio_huecos"], 1)
+            resultado.update({
+                "sospechoso": bool(len(atipicas_desajuste) or len(atipicas_huecos)),
+                "jpeg": True,
+                "mapa_desajuste": [[None if np.isnan(x) else round(float(x), 3) for x in fila] for fila in desajuste],
+                "mapa_doble_compresion": [[None if np.isnan(x) else round(float(x), 3) for x in fila] for fila in huecos],
+                "regiones_atipicas": [
+                    list(region) for region in sorted(set(map(tuple, atipicas_desajuste.tolist() + atipicas_huecos.tolist())))
+                ]
+            })
+            return resultado
         except:
             return {"sospechoso": False}
 
+    def _dct_bloques(self, gray):
+        """
+        DCT ortonormal de cada bloque de 8x8 de la página, como arreglo
+        (filas de bloques, columnas de bloques, 8, 8). Los bordes que no
+        completan un bloque se descartan, como hace la cuadrícula JPEG.
+        """
+        k = np.arange(8)
+        base = np.sqrt(2 / 8) * np.cos((2 * k[None, :] + 1) * k[:, None] * np.pi / 16)
+        base[0] /= np.sqrt(2)
+        base = base.astype(np.float32)
+        filas, columnas = gray.shape[0] // 8, gray.shape[1] // 8
+        bloques = gray[:filas * 8, :columnas * 8].astype(np.float32).reshape(filas, 8, columnas, 8)
+        bloques = bloques.transpose(0, 2, 1, 3) - 128
+        return base @ bloques @ base.T
+
+    def _paso_cuantizacion(self, coeficientes):
+        """
+        Mayor paso de cuantización en cuya retícula cae casi todo coeficiente no
+        nulo de una frecuencia (1 si ninguno, como en una imagen sin comprimir).
+        """
+        coeficientes = coeficientes.ravel()
+        paso = 1
+        for candidato in range(2, FRAUDE["compresion_paso_max"] + 1):
+            no_nulos = coeficientes[np.abs(coeficientes) > candidato / 2] / candidato
+            if len(no_nulos) < 50:
+                break
+            if np.mean(np.abs(no_nulos - np.rint(no_nulos)) < 0.2) >= FRAUDE["compresion_ajuste_min"]:
+                paso = candidato
+        return paso
+
+    def _promedio_regiones(self, suma, cuenta, cuadricula):
+        """
+        Promedio por región de un valor por bloque dado como suma y cuenta. Las
+        regiones con menos de un valor cada cinco bloques quedan en NaN.
+        """
+        suma = self._mapa_regiones(suma, cuadricula)
+        cuenta = self._mapa_regiones(cuenta, cuadricula)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            promedio = suma / cuenta
+        promedio[cuenta < 0.2] = np.nan
+        return promedio
+
+    def _regiones_desviadas(self, mapa, desvio_minimo, sentido):
+        """
+        Regiones que se alejan de la mediana del mapa en el `sentido` indicado (1
+        hacia arriba, -1 hacia abajo) más de tres desviaciones robustas, contando
+        al menos `desvio_minimo` como desviación.
+        """
+        if np.isnan(mapa).all():
+            return np.zeros((0, 2), dtype=np.int64)
+        mediana = np.nanmedian(mapa)
+        desvio = max(1.4826 * float(np.nanmedian(np.abs(mapa - mediana))), desvio_minimo)
+        with np.errstate(invalid="ignore"):
+            return np.argwhere(sentido * (mapa - mediana) > 3 * desvio)
+
     def analizar_patrones_impresion(self, imagen_path):
         """
         Analiza patrones de impresión en el documento.
@@ -230,7 +747,7 @@ class AnalizadorFraude:
 
         try:
             # Cargar imagen
-            img = cv2.imread(imagen_path)
+            img = self._caracteristicas(imagen_path)
             if img is None:
                 return resultados
 
@@ -258,22 +775,10 @@ class AnalizadorFraude:
         Analiza patrones de puntos en la impresión.
         """
         try:
-            # Convertir a escala de grises
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Aplicar umbral adaptativo
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY_INV, 11, 2
-            )
-            
-            # Encontrar contornos
-            contours, _ = cv2.findContours(
-                thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-            )
+            # Componentes de la binarización adaptativa, compartidos con los demás detectores
+            areas = self._caracteristicas(img).componentes_adaptativo.areas
             
             # Analizar distribución de puntos
-            areas = [cv2.contourArea(cnt) for cnt in contours]
             mean_area = np.mean(areas)
             std_area = np.std(areas)
             
@@ -290,7 +795,7 @@ class AnalizadorFraude:
         Analiza la resolución de la imagen.
         """
         try:
-            height, width = img.shape[:2]
+            height, width = self._caracteristicas(img).imagen.shape[:2]
             dpi = 300  # Asumimos 300 DPI para impresoras estándar
             
             # Calcular resolución efectiva
@@ -303,9 +808,11 @@ class AnalizadorFraude:
         except:
             return {"sospechoso": False}
 
-    def verificar_firmas(self, imagen_path):
+    def verificar_firmas(self, imagen_path=None, firmas_detectadas=None):
         """
-        Verifica la autenticidad de las firmas.
+        Verifica la autenticidad de las firmas. Con `firmas_detectadas` (cajas ya
+        detectadas, por ejemplo en todas las páginas del documento) no se vuelve
+        a analizar la imagen.
         """
         resultados = {
             "puntuacion": 0,
@@ -314,13 +821,13 @@ class AnalizadorFraude:
         }
 
         try:
-            # Cargar imagen
-            img = cv2.imread(imagen_path)
-            if img is None:
-                return resultados
-
             # 1. Detección de firmas
-            firmas = self.detectar_firmas(img)
+            if firmas_detectadas is None:
+                img = self._caracteristicas(imagen_path)
+                if img is None:
+                    return resultados
+                firmas_detectadas = self.detectar_firmas(img)
+            firmas = firmas_detectadas
             resultados["detalles"]["firmas_detectadas"] = len(firmas)
 
             # 2. Análisis de calidad de firmas
@@ -349,31 +856,50 @@ class AnalizadorFraude:
         Detecta firmas en la imagen.
         """
         try:
-            # Convertir a escala de grises
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Aplicar umbral adaptativo
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY_INV, 11, 2
-            )
-            
-            # Encontrar contornos
-            contours, _ = cv2.findContours(
-                thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-            )
-            
-            # Filtrar contornos que podrían ser firmas
-            firmas = []
-            for cnt in contours:
-                x, y, w, h = cv2.boundingRect(cnt)
-                if w > 50 and h > 20:  # Ajustar según necesidad
-                    firmas.append((x, y, w, h))
-            
-            return firmas
+            # Mismo detector que el análisis visual: solo regiones probables y
+            # candidatos validados contra las plantillas de firmas
+            firmas = detectar_firmas_sellos(self._caracteristicas(img))["firmas"]
+            return [tuple(int(v) for v in caja) for caja in firmas]
         except:
             return []
 
+    def extraer_glifos(self, img, layout):
+        """
+        Extrae los dígitos de las palabras numéricas de la página (ver
+        extraer_glifos en libreria.glifos_digitos).
+        """
+        try:
+            return extraer_glifos(self._caracteristicas(img), layout)
+        except:
+            return None
+
+    def verificar_glifos(self, glifos_por_pagina):
+        """
+        Compara los dígitos de los montos de todo el documento y marca los que
+        tienen otra fuente, otro grosor, otro tamaño u otra línea base (ver
+        glifos_atipicos). Si los atípicos superan FRAUDE["glifos_fraccion_max"]
+        de los dígitos, la diferencia se atribuye a la calidad del escaneo y no
+        se alerta. Los detalles incluyen cuántas palabras numéricas no se
+        pudieron revisar ("palabras_descartadas").
+        """
+        resultados = {
+            "puntuacion": 0,
+            "alertas": [],
+            "detalles": {}
+        }
+
+        try:
+            comparacion = glifos_atipicos([(n, g) for n, g in glifos_por_pagina if g is not None])
+            resultados["detalles"] = comparacion
+            atipicos = len(comparacion["atipicos"])
+            if atipicos and atipicos <= FRAUDE["glifos_fraccion_max"] * comparacion["digitos"]:
+                resultados["alertas"].append("Dígitos con tipografía distinta en los montos")
+                resultados["puntuacion"] += 0.3
+        except Exception as e:
+            resultados["alertas"].append(f"Error en verificación de dígitos: {str(e)}")
+
+        return resultados
+
     def analizar_calidad_firmas(self, firmas):
         """
         Analiza la calidad de las firmas detectadas.
@@ -428,7 +954,7 @@ class AnalizadorFraude:
 
         try:
             # Cargar imagen
-            img = cv2.imread(imagen_path)
+            img = self._caracteristicas(imagen_path)
             if img is None:
                 return resultados
 
@@ -456,12 +982,10 @@ class AnalizadorFraude:
         Analiza la calidad general de la imagen.
         """
         try:
-            # Convertir a escala de grises
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Calcular métricas de calidad
-            blur = cv2.Laplacian(gray, cv2.CV_64F).var()
-            contrast = np.std(gray)
+            # Métricas de calidad compartidas con el análisis visual
+            pagina = self._caracteristicas(img)
+            blur = pagina.nitidez
+            contrast = pagina.contraste
             
             return {
                 "sospechoso": blur < 100 or contrast < 50,
@@ -476,26 +1000,11 @@ class AnalizadorFraude:
         Analiza la presencia de elementos de seguridad.
         """
         try:
-            # Convertir a escala de grises
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
             # Buscar patrones que podrían ser elementos de seguridad
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY_INV, 11, 2
-            )
-            
-            # Encontrar contornos
-            contours, _ = cv2.findContours(
-                thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-            )
+            areas = self._caracteristicas(img).componentes_adaptativo.areas
             
             # Contar elementos de seguridad
-            elementos_seguridad = 0
-            for cnt in contours:
-                area = cv2.contourArea(cnt)
-                if 100 < area < 1000:  # Ajustar según necesidad
-                    elementos_seguridad += 1
+            elementos_seguridad = int(np.count_nonzero((areas > 100) & (areas < 1000)))  # Ajustar según necesidad
             
             return {
                 "sospechoso": elementos_seguridad < 3,
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+
+from libreria.config import OCR
+
+
+class CacheOCR:
+    """
+    Caché en disco de resultados de OCR direccionada por contenido.
+
+    La clave es el SHA-256 de los bytes del archivo más los parámetros de OCR,
+    así que un mismo PDF subido con otro nombre o en otra solicitud reutiliza el
+    resultado. Cuando el directorio supera el tamaño máximo se eliminan las
+    entradas usadas hace más tiempo (LRU según la fecha de acceso registrada).
+    """
+
+    def __init__(self, directorio=None, max_bytes=None):
+        self.directorio = directorio or OCR["cache_directorio"]
+        self.max_bytes = max_bytes if max_bytes is not None else OCR["cache_max_bytes"]
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    @staticmethod
+    def hash_archivo(file_path):
+        """
+        Calcula el SHA-256 del contenido del archivo leyéndolo por bloques.
+        """
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as archivo:
+            for bloque in iter(lambda: archivo.read(1024 * 1024), b""):
+                sha.update(bloque)
+        return sha.hexdigest()
+
+    def clave(self, file_path, parametros):
+        """
+        Construye la clave de la entrada a partir del contenido y los parámetros.
+        """
+        parametros_json = json.dumps(parametros, sort_keys=True, default=str)
+        sha_parametros = hashlib.sha256(parametros_json.encode("utf-8")).hexdigest()[:16]
+        return f"{self.hash_archivo(file_path)}_{sha_parametros}"
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.json")
+
+    def obtener(self, clave):
+        """
+        Retorna el valor guardado o None si no existe. Marca la entrada como usada.
+        """
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "r", encoding="utf-8") as archivo:
+                valor = json.load(archivo)
+            os.utime(ruta, None)
+        except (OSError, ValueError):
+            with self._lock:
+                self.fallos += 1
+            return None
+        with self._lock:
+            self.aciertos += 1
+        return valor
+
+    def guardar(self, clave, valor):
+        """
+        Escribe la entrada de forma atómica y aplica el límite de tamaño.
+        """
+        ruta = self._ruta(clave)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump(valor, archivo, ensure_ascii=False)
+        os.replace(temporal, ruta)
+        self.desalojar()
+
+    def obtener_o_calcular(self, file_path, parametros, calcular):
+        """
+        Retorna el resultado en caché para el archivo o lo calcula con
+        calcular(file_path) y lo guarda.
+        """
+        clave = self.clave(file_path, parametros)
+        valor = self.obtener(clave)
+        if valor is None:
+            valor = calcular(file_path)
+            self.guardar(clave, valor)
+        return valor
+
+    def desalojar(self):
+        """
+        Elimina las entradas menos recientes hasta quedar por debajo de max_bytes.
+        """
+        entradas = []
+        total = 0
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(".json"):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                stats = os.stat(ruta)
+            except OSError:
+                continue
+            entradas.append((stats.st_mtime, stats.st_size, ruta))
+            total += stats.st_size
+        if total <= self.max_bytes:
+            return
+        for _, tamano, ruta in sorted(entradas):
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tamano
+            with self._lock:
+                self.desalojos += 1
+            if total <= self.max_bytes:
+                break
+
+    def estadisticas(self):
+        """
+        Retorna los contadores de aciertos, fallos y desalojos de este proceso.
+        """
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0
+            }
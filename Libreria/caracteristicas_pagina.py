@@ -0,0 +1,144 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+def _pasos_contorno(binaria):
+    """
+    Veces que el contorno externo (8-conectado) pasa por cada píxel del objeto:
+    0 en el interior, 1 en un borde común y 2 o más donde el objeto tiene un
+    píxel de grosor y el contorno lo recorre de ida y de vuelta. Es el número de
+    conectividad de Yokoi, calculado para toda la imagen con desplazamientos.
+    """
+    fondo = np.pad(binaria == 0, 1, constant_values=True)
+    alto, ancho = binaria.shape
+    # Vecinos en orden circular: E, NE, N, NO, O, SO, S, SE
+    vecinos = [
+        fondo[1 + dy:1 + dy + alto, 1 + dx:1 + dx + ancho]
+        for dy, dx in ((0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (1, 1))
+    ]
+    pasos = np.zeros(binaria.shape, dtype=np.uint8)
+    for k in (0, 2, 4, 6):
+        pasos += vecinos[k] & ~(vecinos[k + 1] & vecinos[(k + 2) % 8])
+    pasos[binaria == 0] = 0
+    return pasos
+
+
+class ComponentesPagina:
+    """
+    Objetos de una binarización de la página (equivalentes a los contornos
+    externos de cv2.findContours con RETR_EXTERNAL) obtenidos en una sola pasada
+    de componentes conectados, con sus áreas y cajas envolventes como arreglos.
+
+    - areas: arreglo (N,) float64 con el área encerrada por el contorno de cada
+      objeto (la de cv2.contourArea, calculada por el teorema de Pick con el
+      largo del contorno, que cuenta dos veces los tramos de un píxel de grosor).
+    - cajas: arreglo (N, 4) int32 con x, y, ancho, alto (cv2.boundingRect).
+    - pixeles: arreglo (N,) int32 con los píxeles de cada objeto, huecos incluidos.
+
+    Los detectores filtran con máscaras sobre estos arreglos, así el costo no
+    crece con el número de contornos de la página.
+    """
+
+    def __init__(self, binaria):
+        # Se rellenan los huecos (el fondo que no se alcanza desde el borde) para
+        # que lo que está dentro de un objeto forme parte de él, como con RETR_EXTERNAL
+        relleno = cv2.copyMakeBorder(binaria, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+        cv2.floodFill(relleno, None, (0, 0), 128)
+        lleno = cv2.compare(relleno[1:-1, 1:-1], 128, cv2.CMP_NE)
+        n, etiquetas, stats, _ = cv2.connectedComponentsWithStats(lleno, connectivity=8)
+
+        # Largo del contorno de cada objeto: área del polígono = píxeles - largo / 2 - 1
+        largo = np.bincount(etiquetas.ravel(), weights=_pasos_contorno(lleno).ravel(), minlength=n)
+
+        self.pixeles = stats[1:, cv2.CC_STAT_AREA].astype(np.int32)
+        self.areas = np.maximum(0.0, self.pixeles - largo[1:] / 2 - 1)
+        self.cajas = stats[1:, :4].astype(np.int32)
+
+    def __len__(self):
+        return len(self.pixeles)
+
+
+class CaracteristicasPagina:
+    """
+    Características de imagen de una página que comparten los detectores del
+    análisis visual y del AnalizadorFraude: escala de grises, binarizaciones,
+    componentes (con áreas y cajas) y métricas de calidad.
+
+    Cada característica se calcula la primera vez que se pide y se reutiliza
+    después, así los umbrales y los componentes se calculan una sola vez por
+    página aunque varios detectores los usen, también desde hilos distintos (un
+    hilo que pide una característica en cálculo espera a que termine).
+    """
+
+    def __init__(self, imagen):
+        self.imagen = imagen
+        self._cache = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _obtener(self, clave, calcular):
+        if clave in self._cache:
+            return self._cache[clave]
+        with self._lock:
+            lock = self._locks.setdefault(clave, threading.Lock())
+        with lock:
+            if clave not in self._cache:
+                self._cache[clave] = calcular()
+        return self._cache[clave]
+
+    @property
+    def gris(self):
+        """Página en escala de grises."""
+        return self._obtener("gris", lambda: (
+            self.imagen if self.imagen.ndim == 2 else cv2.cvtColor(self.imagen, cv2.COLOR_BGR2GRAY)
+        ))
+
+    @property
+    def umbral_adaptativo(self):
+        """Binarización adaptativa gaussiana invertida (bloque 11, C=2)."""
+        return self._obtener("umbral_adaptativo", lambda: cv2.adaptiveThreshold(
+            self.gris, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2
+        ))
+
+    @property
+    def umbral_fijo(self):
+        """Binarización invertida con umbral fijo en 127."""
+        return self._obtener(
+            "umbral_fijo", lambda: cv2.threshold(self.gris, 127, 255, cv2.THRESH_BINARY_INV)[1]
+        )
+
+    @property
+    def componentes_adaptativo(self):
+        """ComponentesPagina de la binarización adaptativa."""
+        return self._obtener("componentes_adaptativo", lambda: ComponentesPagina(self.umbral_adaptativo))
+
+    @property
+    def componentes_fijo(self):
+        """ComponentesPagina de la binarización con umbral fijo."""
+        return self._obtener("componentes_fijo", lambda: ComponentesPagina(self.umbral_fijo))
+
+    def miniatura(self, lado_max):
+        """
+        CaracteristicasPagina de la página reducida para que su lado mayor mida
+        como máximo `lado_max` píxeles, y el factor de escala aplicado (1.0 si la
+        página ya era más pequeña, en cuyo caso se retorna esta misma instancia).
+        """
+        def calcular():
+            escala = lado_max / max(self.imagen.shape[:2])
+            if escala >= 1:
+                return self, 1.0
+            reducida = cv2.resize(self.imagen, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+            return CaracteristicasPagina(reducida), escala
+        return self._obtener(("miniatura", lado_max), calcular)
+
+    @property
+    def nitidez(self):
+        """Varianza del laplaciano de la página."""
+        return self._obtener("nitidez", lambda: float(cv2.Laplacian(self.gris, cv2.CV_64F).var()))
+
+    @property
+    def contraste(self):
+        """Desviación estándar de los niveles de gris."""
+        return self._obtener("contraste", lambda: float(np.std(self.gris)))
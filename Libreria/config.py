@@ -9,7 +9,9 @@ TIPOS_DOCUMENTOS = {
             "analisis_visual": True,
             "metadatos": True,
             "firmas": True,
-            "calidad": True
+            "calidad": True,
+            # Correr los detectores visuales a resolución completa aunque el triaje no marque nada
+            "visual_completo": True
         }
     },
     "carta laboral": {
@@ -19,7 +21,9 @@ TIPOS_DOCUMENTOS = {
             "analisis_visual": True,
             "metadatos": True,
             "firmas": True,
-            "calidad": True
+            "calidad": True,
+            # Correr los detectores visuales a resolución completa aunque el triaje no marque nada
+            "visual_completo": True
         }
     },
     "extracto bancario": {
@@ -29,7 +33,8 @@ TIPOS_DOCUMENTOS = {
             "analisis_visual": True,
             "metadatos": True,
             "firmas": False,  # Los extractos bancarios no suelen tener firmas
-            "calidad": True
+            "calidad": True,
+            "visual_completo": False
         }
     }
 }
@@ -40,4 +45,204 @@ UMBRALES = {
     "riesgo_medio": 0.5,
     "discrepancia_montos": 10,
     "calidad_minima": 100
-}
\ No newline at end of file
+}
+
+# Configuración de extracción de texto (OCR)
+OCR = {
+    "poppler_path": "/usr/local/bin",
+    # Páginas rasterizadas que se conservan en memoria por documento (None = todas)
+    # y páginas que se leen para clasificar el documento antes de extraer el resto
+    "max_paginas_en_memoria": 8,
+    "paginas_clasificacion": 2,
+    # Leer la capa de texto embebida de los PDF y solo hacer OCR de las páginas sin texto
+    "usar_capa_texto": True,
+    "min_caracteres_capa_texto": 20,
+    "min_proporcion_alfanumerica": 0.5,
+    # Motor de OCR: "pytesseract" (un proceso tesseract por página), "tesserocr"
+    # (API en memoria que carga el idioma una vez por proceso; dependencia
+    # opcional, pip install -r requirements-opcional.txt) o "auto" (tesserocr si
+    # está instalado y si no pytesseract), e idioma de Tesseract
+    "motor": "auto",
+    "lang": "spa",
+    # Perfil de preprocesamiento (ver PERFILES_OCR)
+    "perfil": "rapido",
+    # Modo de OCR: "pagina" (página completa) o "regiones" (solo las regiones de
+    # texto detectadas; los campos numéricos de pocas palabras leídos con menos
+    # de "regiones_confianza_relectura" se releen con perfil de dígitos/moneda)
+    "modo_ocr": "pagina",
+    "regiones_min_alto": 8,
+    "regiones_max_alto_relativo": 0.2,
+    "regiones_margen": 4,
+    "regiones_proporcion_numerica": 0.6,
+    "regiones_max_palabras_campo": 3,
+    "regiones_confianza_relectura": 85,
+    # Valores numéricos extraídos por el modelo cuya confianza de OCR se reporta
+    # (mínimo de dígitos) y confianza por debajo de la cual se advierte al usuario
+    "min_digitos_valor": 4,
+    "confianza_min_valores": 60,
+    # Procesos para el OCR por página (None = número de núcleos) y páginas
+    # rasterizadas que pueden estar esperando OCR al mismo tiempo
+    "procesos": None,
+    "max_paginas_en_vuelo": 4,
+    # Caché en disco de resultados de OCR (clave: SHA-256 del archivo + parámetros)
+    "usar_cache": True,
+    "cache_directorio": "cache_ocr",
+    "cache_max_bytes": 200 * 1024 * 1024
+}
+
+# Configuración del análisis visual
+VISUAL = {
+    # Hilos que analizan páginas en paralelo, compartidos por todas las sesiones
+    # (None = número de núcleos), e hilos internos de OpenCV (None = núcleos / hilos,
+    # así el total de hilos activos no supera el número de núcleos)
+    "hilos": None,
+    "hilos_opencv": None,
+    # Triaje: primero se analiza una miniatura de la página (lado mayor en píxeles)
+    # y la resolución completa solo si hay anomalías (nitidez bajo el mínimo,
+    # poca diferencia entre tinta y papel, o candidatos a firma o sello que
+    # confirmar) o el tipo de documento lo exige. Que falten sellos, firmas o
+    # marcas de agua no es motivo para escalar. El rango tonal es la diferencia
+    # entre los percentiles 1 y 99 de los grises de la miniatura
+    "triaje": True,
+    "lado_miniatura": 1000,
+    "nitidez_min": 100,
+    "rango_tonal_min": 100,
+    # Firmas y sellos: se buscan desde esta fracción de la altura hacia abajo y
+    # alrededor de las palabras ancla del OCR, y se comparan con las plantillas
+    # (dibujadas más las de plantillas_directorio: sello_*.png / firma_*.png)
+    "region_firmas_desde": 2 / 3,
+    "anclas_firma": r"^(atentamente|cordialmente|firma|sello|recibido)",
+    "plantillas_directorio": "plantillas_visuales",
+    "distancia_max_plantilla": 2.5,
+    # Candidatos a firma o sello: área mínima de un trazo (menos es moteado del
+    # papel) y alto de letra (mínimo, máximo) y letras mínimas por línea con que
+    # se reconocen las líneas de texto sin OCR; todo en píxeles a escala completa
+    "area_min_trazo": 120,
+    "alto_letra": (6, 60),
+    "letras_min_linea": 3,
+    # Tabla por documento del análisis visual por lotes (analisis_visual_lote.py)
+    # que el pipeline de crédito une a las solicitudes (nitidez_docs_min)
+    "variables_lote": "analisis_visual_documentos.parquet"
+}
+
+# Configuración del AnalizadorFraude
+FRAUDE = {
+    # Hilos que corren los detectores en paralelo, compartidos por todos los
+    # análisis (None = número de núcleos), y tiempo máximo por documento en
+    # segundos (None = sin límite); al agotarlo los detectores pendientes se omiten.
+    "hilos": None,
+    "presupuesto_segundos": None,
+    # Páginas cargadas que pueden estar esperando sus detectores al mismo tiempo
+    "max_paginas_en_vuelo": 4,
+    # Error Level Analysis: calidades JPEG con que se recomprime la página (la
+    # mayor decide "sospechoso"), cuadrícula del mapa por regiones, piso del
+    # error al comparar dos calidades y fracción del crecimiento del error de
+    # las regiones de textura parecida por debajo de la cual una región es
+    # atípica (ya pasó por una compresión más fuerte que el resto)
+    "ela_calidades": (90, 75, 60),
+    "ela_cuadricula": 8,
+    "ela_piso": 1.0,
+    "ela_umbral_region": 0.7,
+    # Ruido: "teselas" (estimador de Immerkær por tesela) o "profundo"
+    # (fastNlMeansDenoising de toda la página, mucho más lento). Tamaño de la
+    # tesela, lado de la dilatación de la tinta que se excluye de la medida,
+    # piso de la mediana, cuántas veces una tesela debe alejarse de la mediana
+    # (en uno u otro sentido) y por cuántos niveles de gris como mínimo para
+    # ser atípica
+    "ruido_modo": "teselas",
+    "ruido_tesela": 64,
+    "ruido_margen_tinta": 7,
+    "ruido_piso": 1.0,
+    "ruido_umbral_tesela": 2.0,
+    "ruido_diferencia_min": 2.5,
+    # Compresión (DCT por bloques de 8x8): frecuencias (fila, columna) que se
+    # analizan, distancia a 0 y 255 de los bloques útiles, mayor paso de
+    # cuantización buscado y proporción de coeficientes que deben caer en su
+    # retícula, valor cuantizado máximo de los histogramas y población mínima
+    # de los vecinos de un hueco, cuadrícula del mapa por regiones y desviación
+    # mínima de los mapas de desajuste y de doble compresión
+    "compresion_frecuencias": ((0, 1), (1, 0), (1, 1), (0, 2), (2, 0), (1, 2), (2, 1), (2, 2), (0, 3), (3, 0)),
+    "compresion_margen": 10,
+    "compresion_paso_max": 40,
+    "compresion_ajuste_min": 0.85,
+    "compresion_valor_max": 40,
+    "compresion_poblacion_min": 200,
+    "compresion_cuadricula": 8,
+    "compresion_desvio_desajuste": 0.03,
+    "compresion_desvio_huecos": 0.05,
+    # Copia dentro de la página (copy-move): lado mayor de la página al buscar
+    # puntos ORB, número de puntos y cuadrícula en que se reparten, vecinos
+    # buscados por punto y razón g2NN, separación mínima entre copias y celda de
+    # agrupación del desplazamiento en píxeles, pares confirmados mínimos por
+    # grupo y grupos revisados, correlación mínima del ruido de fondo para
+    # confirmar un par y ruido mínimo para poder compararlo. Sin ruido, el par
+    # se confirma por la tinta: radio del parche, diferencia de gris tolerada,
+    # fracción mínima de tinta idéntica, correlación desde la que el parche
+    # cuenta como texto repetido y lado de la miniatura donde se busca la
+    # repetición. Por último, tiempo máximo por página en segundos
+    "copia_lado_max": 2000,
+    "copia_puntos": 5000,
+    "copia_teselas": 4,
+    "copia_vecinos": 3,
+    "copia_razon": 0.6,
+    "copia_distancia_min": 40,
+    "copia_celda": 8,
+    "copia_coincidencias_min": 6,
+    "copia_grupos_max": 50,
+    "copia_correlacion_min": 0.6,
+    "copia_ruido_min": 0.1,
+    "copia_radio_tinta": 12,
+    "copia_tinta_tolerancia": 8,
+    "copia_tinta_min": 0.995,
+    "copia_tinta_repeticion": 0.9,
+    "copia_lado_repeticion": 1000,
+    "copia_segundos_max": 2.0,
+    # Dígitos de los montos: expresión de las palabras numéricas que se revisan,
+    # altura mínima de la palabra en píxeles, lado de la huella de cada dígito,
+    # ejemplares mínimos de un dígito para comparar su forma, desviación mínima
+    # de la forma (1 - correlación entre huellas), tolerancia del grosor del
+    # trazo (fracción de la mediana del mismo dígito), tolerancias de altura y de
+    # línea base (fracción de la altura de los dígitos de la palabra),
+    # tolerancias de la altura de los dígitos y del grosor de su trazo respecto
+    # a la altura de su línea (fracción de la mediana de los dígitos del
+    # documento y de la del mismo dígito, respectivamente) y fracción
+    # máxima de dígitos atípicos (más que eso es ruido del escaneo, no una edición)
+    "glifos_patron": r"^\$?\d[\d.,]*\d$",
+    "glifos_altura_min": 10,
+    "glifos_lado": 16,
+    "glifos_min_por_digito": 4,
+    "glifos_desvio_forma": 0.025,
+    "glifos_tolerancia_grosor": 0.2,
+    "glifos_tolerancia_altura": 0.12,
+    "glifos_tolerancia_base": 0.12,
+    "glifos_tolerancia_altura_linea": 0.1,
+    "glifos_tolerancia_trazo": 0.2,
+    "glifos_fraccion_max": 0.2
+}
+
+# Perfiles de preprocesamiento para OCR. "rapido" es para operar bajo carga y
+# "preciso" para escalamientos; benchmark_ocr.py mide su velocidad y exactitud.
+PERFILES_OCR = {
+    "rapido": {
+        "escala_grises": True,
+        "dpi": 200,
+        "dpi_min": 150,
+        "dpi_max": 250,
+        "altura_caracter": 24,
+        "corregir_orientacion": False,
+        "enderezar": False,
+        "max_inclinacion": 10,
+        "binarizar": False
+    },
+    "preciso": {
+        "escala_grises": True,
+        "dpi": 300,
+        "dpi_min": 200,
+        "dpi_max": 400,
+        "altura_caracter": 32,
+        "corregir_orientacion": True,
+        "enderezar": True,
+        "max_inclinacion": 10,
+        "binarizar": True
+    }
+}
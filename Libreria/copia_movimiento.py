@@ -0,0 +1,265 @@
+import time
+
+import cv2
+import numpy as np
+
+from libreria.config import FRAUDE
+
+# Índice LSH de FLANN, el que corresponde a descriptores binarios como ORB
+FLANN_INDEX_LSH = 6
+
+
+def _puntos_por_teselas(gris, total, teselas):
+    """
+    Puntos ORB repartidos en una cuadrícula de `teselas` x `teselas`, con el
+    mismo cupo por tesela. Con un solo cupo para toda la página el texto se
+    queda con casi todos los puntos y un sello (trazos curvos y finos) con
+    ninguno. Cada tesela se procesa con un margen para que los puntos cerca de
+    su borde tengan el parche completo.
+    """
+    alto, ancho = gris.shape
+    margen = 32
+    orb = cv2.ORB_create(nfeatures=max(1, total // (teselas * teselas)), fastThreshold=10)
+    puntos = []
+    for i in range(teselas):
+        y0, y1 = i * alto // teselas, (i + 1) * alto // teselas
+        for j in range(teselas):
+            x0, x1 = j * ancho // teselas, (j + 1) * ancho // teselas
+            oy, ox = max(0, y0 - margen), max(0, x0 - margen)
+            for punto in orb.detect(gris[oy:min(alto, y1 + margen), ox:min(ancho, x1 + margen)], None):
+                x, y = punto.pt[0] + ox, punto.pt[1] + oy
+                if x0 <= x < x1 and y0 <= y < y1:
+                    puntos.append(cv2.KeyPoint(x, y, punto.size, punto.angle, punto.response, punto.octave))
+    return cv2.ORB_create(nfeatures=total).compute(gris, puntos)
+
+
+def _ruido_fondo(pagina):
+    """
+    Ruido del fondo de la página (diferencia de dos desenfoques gaussianos, la
+    banda de frecuencias que una recompresión JPEG conserva mejor) y la máscara
+    de fondo, lejos del trazo. Antes de filtrar, el trazo se reemplaza por el
+    promedio del fondo que lo rodea para que el texto no se filtre al residuo.
+    """
+    gris = np.float32(pagina.gris)
+    fondo = cv2.dilate(pagina.umbral_fijo, np.ones((7, 7), np.uint8)) == 0
+    peso = np.float32(fondo)
+    promedio = cv2.blur(gris * peso, (31, 31)) / np.maximum(cv2.blur(peso, (31, 31)), 1e-3)
+    relleno = np.where(fondo, gris, promedio)
+    residuo = cv2.GaussianBlur(relleno, (0, 0), 1.5) - cv2.GaussianBlur(relleno, (0, 0), 4)
+    return residuo, fondo
+
+
+def _coincidencias(descriptores, coordenadas, distancia_min):
+    """
+    Pares de puntos (i, j) con descriptores casi iguales y separados al menos
+    `distancia_min` píxeles. Cada punto se busca en el índice LSH de la propia
+    página y sus vecinos se aceptan en orden mientras la distancia al siguiente
+    sea claramente mayor (criterio g2NN), así un motivo copiado varias veces
+    aporta todas sus copias.
+    """
+    indice = cv2.FlannBasedMatcher(
+        dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1),
+        dict(checks=50)
+    )
+    vecinos = indice.knnMatch(descriptores, descriptores, k=FRAUDE["copia_vecinos"] + 1)
+    pares = set()
+    for i, lista in enumerate(vecinos):
+        otros = [m for m in lista if m.trainIdx != i]
+        for actual, siguiente in zip(otros, otros[1:]):
+            if actual.distance >= FRAUDE["copia_razon"] * max(siguiente.distance, 1.0):
+                break
+            pares.add((min(i, actual.trainIdx), max(i, actual.trainIdx)))
+    if not pares:
+        return np.zeros((0, 2), dtype=np.intp)
+    pares = np.array(sorted(pares), dtype=np.intp)
+    separacion = np.linalg.norm(coordenadas[pares[:, 1]] - coordenadas[pares[:, 0]], axis=1)
+    return pares[separacion >= distancia_min]
+
+
+def _correlacion_ruido(residuo, fondo, punto, desplazamiento, radio):
+    """
+    Correlación del ruido de fondo entre el entorno de `punto` y el del punto
+    desplazado. Solo cuentan los píxeles de fondo (lejos del trazo) de ambos:
+    dos impresiones de la misma cifra coinciden en el trazo pero no en el
+    ruido, una copia coincide en los dos.
+
+    Retorna None si la comparación no es posible (entorno fuera de la página,
+    poco fondo o fondo sin ruido, como en una página renderizada de un PDF).
+    """
+    alto, ancho = residuo.shape
+    x, y = punto
+    dx, dy = desplazamiento
+    x0, y0, x1, y1 = x - radio, y - radio, x + radio, y + radio
+    if min(x0, y0, x0 + dx, y0 + dy) < 0 or max(x1, x1 + dx) > ancho or max(y1, y1 + dy) > alto:
+        return None
+    comun = fondo[y0:y1, x0:x1] & fondo[y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+    if np.count_nonzero(comun) < radio * radio:
+        return None
+    origen = residuo[y0:y1, x0:x1][comun]
+    destino = residuo[y0 + dy:y1 + dy, x0 + dx:x1 + dx][comun]
+    # Ruido medido con la mediana, para que unos pocos píxeles de borde no cuenten
+    if min(np.median(np.abs(origen)), np.median(np.abs(destino))) < FRAUDE["copia_ruido_min"]:
+        return None
+    return float(np.corrcoef(origen, destino)[0, 1])
+
+
+def _coincidencia_tinta(gris, tinta, punto, desplazamiento, radio):
+    """
+    Respaldo de _correlacion_ruido para las páginas sin ruido de fondo: compara
+    la forma y la tinta del parche. Una copia repite el trazo píxel a píxel,
+    suavizado de los bordes incluido; el mismo texto impreso dos veces cae en
+    otra fracción de píxel y su suavizado cambia.
+
+    Retorna la fracción de los píxeles de tinta (de uno u otro parche) cuyo gris
+    difiere a lo sumo FRAUDE["copia_tinta_tolerancia"] niveles, o None si el
+    entorno sale de la página o casi no tiene tinta.
+    """
+    alto, ancho = gris.shape
+    x, y = punto
+    dx, dy = desplazamiento
+    x0, y0, x1, y1 = x - radio, y - radio, x + radio, y + radio
+    if min(x0, y0, x0 + dx, y0 + dy) < 0 or max(x1, x1 + dx) > ancho or max(y1, y1 + dy) > alto:
+        return None
+    zona = tinta[y0:y1, x0:x1] | tinta[y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+    if np.count_nonzero(zona) < 2 * radio:
+        return None
+    diferencia = np.abs(gris[y0:y1, x0:x1] - gris[y0 + dy:y1 + dy, x0 + dx:x1 + dx])[zona]
+    return float(np.mean(diferencia <= FRAUDE["copia_tinta_tolerancia"]))
+
+
+def _repetida(gris, caja, desplazamiento):
+    """
+    Indica si el contenido de `caja` (x, y, ancho, alto) aparece en `gris` una
+    tercera vez, además de en la caja y en su copia desplazada. Sin ruido de
+    fondo, el texto que el documento repite (filas iguales de una tabla) es
+    idéntico píxel a píxel a una copia; lo que lo delata es que se repite más
+    de una vez.
+    """
+    x, y, w, h = caja
+    if w < 2 or h < 2:
+        return False
+    mapa = cv2.matchTemplate(gris, gris[y:y + h, x:x + w], cv2.TM_CCOEFF_NORMED)
+    for px, py in ((x, y), (x + desplazamiento[0], y + desplazamiento[1])):
+        mapa[max(0, py - h // 2):max(0, py + h // 2 + 1), max(0, px - w // 2):max(0, px + w // 2 + 1)] = -1
+    return float(mapa.max()) >= FRAUDE["copia_tinta_repeticion"]
+
+
+def _caja(puntos, radio, ancho, alto):
+    """Caja (x, y, ancho, alto) que cubre los puntos con su entorno, recortada a la página."""
+    x0, y0 = np.maximum(puntos.min(axis=0) - radio, 0)
+    x1, y1 = np.minimum(puntos.max(axis=0) + radio, (ancho, alto))
+    return [int(x0), int(y0), int(x1 - x0), int(y1 - y0)]
+
+
+def detectar_copia_movimiento(pagina, segundos_max=None):
+    """
+    Detecta regiones copiadas y pegadas dentro de la misma página (copy-move),
+    como una cifra o un sello duplicados.
+
+    Se extraen puntos ORB repartidos por toda la página (reducida a
+    FRAUDE["copia_lado_max"] si es más grande), se buscan sus pares en un índice
+    LSH de FLANN y los pares se agrupan por desplazamiento: una región copiada
+    produce muchos pares con el mismo desplazamiento. Cada par de un grupo se
+    confirma comparando el ruido de fondo alrededor de los dos puntos a
+    resolución completa (ver _correlacion_ruido), lo que descarta el texto que
+    simplemente se repite en la página. Donde el fondo no tiene ruido (una
+    página renderizada de un PDF) el par se confirma comparando la tinta del
+    parche (ver _coincidencia_tinta) y el grupo se descarta si el parche aparece
+    una tercera vez (ver _repetida). Las regiones reportadas cubren los puntos
+    confirmados y no salen de la página.
+
+    Parámetros:
+    pagina (CaracteristicasPagina): Página a analizar.
+    segundos_max (float): Tiempo máximo; al agotarlo no se revisan más grupos
+        y el resultado se marca "incompleto". Por defecto FRAUDE["copia_segundos_max"].
+
+    Retorna:
+    dict: "pares" (lista de {"origen", "destino", "desplazamiento",
+        "coincidencias", "correlacion", "prueba"} con cajas (x, y, ancho, alto)
+        en coordenadas de la página; "prueba" es "ruido" o "tinta" según cómo se
+        confirmó la mayoría de los puntos), "puntos", "incompleto" y "segundos".
+    """
+    inicio = time.perf_counter()
+    limite = inicio + (segundos_max if segundos_max is not None else FRAUDE["copia_segundos_max"])
+    resultado = {"pares": [], "puntos": 0, "incompleto": False}
+
+    reducida, escala = pagina.miniatura(FRAUDE["copia_lado_max"])
+    puntos, descriptores = _puntos_por_teselas(reducida.gris, FRAUDE["copia_puntos"], FRAUDE["copia_teselas"])
+    resultado["puntos"] = len(puntos)
+    minimo = FRAUDE["copia_coincidencias_min"]
+    pares = np.zeros((0, 2), dtype=np.intp)
+    if descriptores is not None and len(puntos) >= 2 * minimo:
+        coordenadas = np.float32([p.pt for p in puntos]) / escala
+        pares = _coincidencias(descriptores, coordenadas, FRAUDE["copia_distancia_min"])
+    if not len(pares):
+        resultado["segundos"] = round(time.perf_counter() - inicio, 4)
+        return resultado
+
+    # Desplazamiento de cada par con un signo canónico (hacia la derecha, o hacia
+    # abajo si es vertical), agrupado en celdas de FRAUDE["copia_celda"] píxeles
+    desplazamientos = coordenadas[pares[:, 1]] - coordenadas[pares[:, 0]]
+    invertir = (desplazamientos[:, 0] < 0) | ((desplazamientos[:, 0] == 0) & (desplazamientos[:, 1] < 0))
+    pares[invertir] = pares[invertir][:, ::-1]
+    desplazamientos[invertir] *= -1
+    celdas = np.round(desplazamientos / FRAUDE["copia_celda"]).astype(np.int64)
+    _, grupo, cuenta = np.unique(celdas, axis=0, return_inverse=True, return_counts=True)
+    grupo = grupo.ravel()
+
+    # Ruido de fondo y tinta de toda la página, una sola vez
+    residuo, fondo = _ruido_fondo(pagina)
+    gris = np.float32(pagina.gris)
+    tinta = pagina.umbral_fijo > 0
+    alto, ancho = gris.shape
+    radio = 24
+    radio_tinta = FRAUDE["copia_radio_tinta"]
+    for g in np.argsort(-cuenta)[:FRAUDE["copia_grupos_max"]]:
+        if cuenta[g] < minimo:
+            break
+        if time.perf_counter() >= limite:
+            resultado["incompleto"] = True
+            break
+        seleccion = grupo == g
+        desplazamiento = tuple(int(v) for v in np.round(np.median(desplazamientos[seleccion], axis=0)))
+        # Un desplazamiento que cae en el borde de dos celdas se reparte en ambas
+        if any(max(abs(desplazamiento[0] - dx), abs(desplazamiento[1] - dy)) <= FRAUDE["copia_celda"]
+               for dx, dy in (par["desplazamiento"] for par in resultado["pares"])):
+            continue
+        confirmados = []
+        correlaciones = []
+        por_tinta = 0
+        for x, y in np.round(coordenadas[pares[seleccion, 0]]).astype(int):
+            correlacion = _correlacion_ruido(residuo, fondo, (x, y), desplazamiento, radio)
+            if correlacion is None:
+                # Sin ruido que comparar, la copia se reconoce por la tinta idéntica
+                correlacion = _coincidencia_tinta(gris, tinta, (x, y), desplazamiento, radio_tinta)
+                if correlacion is not None and correlacion >= FRAUDE["copia_tinta_min"]:
+                    por_tinta += 1
+                    confirmados.append((x, y))
+                    correlaciones.append(correlacion)
+            elif correlacion >= FRAUDE["copia_correlacion_min"]:
+                confirmados.append((x, y))
+                correlaciones.append(correlacion)
+        if len(confirmados) < minimo:
+            continue
+        confirmados = np.array(confirmados)
+        prueba = "tinta" if 2 * por_tinta > len(confirmados) else "ruido"
+        if prueba == "tinta":
+            # La prueba de repetición se hace en una miniatura, sobre el entorno
+            # del punto central del grupo
+            muestra, escala_muestra = pagina.miniatura(FRAUDE["copia_lado_repeticion"])
+            mediana = np.median(confirmados, axis=0)
+            centro = confirmados[np.argmin(np.abs(confirmados - mediana).sum(axis=1))]
+            cercanos = confirmados[np.all(np.abs(confirmados - centro) <= 3 * radio, axis=1)]
+            caja = [int(round(v * escala_muestra)) for v in _caja(cercanos, radio, ancho, alto)]
+            if _repetida(muestra.gris, caja, tuple(int(round(v * escala_muestra)) for v in desplazamiento)):
+                continue
+        resultado["pares"].append({
+            "origen": _caja(confirmados, radio, ancho, alto),
+            "destino": _caja(confirmados + desplazamiento, radio, ancho, alto),
+            "desplazamiento": list(desplazamiento),
+            "coincidencias": len(confirmados),
+            "correlacion": round(float(np.median(correlaciones)), 3),
+            "prueba": prueba
+        })
+    resultado["segundos"] = round(time.perf_counter() - inicio, 4)
+    return resultado
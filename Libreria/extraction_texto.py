@@ -1,35 +1,297 @@
-import pdf2image
-from PIL import Image
-import pytesseract
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+import PyPDF2
 from docx import Document
 
+from libreria.config import OCR
+from libreria import motores_ocr
+from libreria.ocr_regiones import ocr_layout_por_regiones
+from libreria.paginas_documento import PaginasDocumento, renderizar_pagina_pdf
+from libreria import preprocesamiento
+
 
-def extraccion_texto(file_path):
+class CapaTextoPDF:
     """
-    Extrae texto de un archivo PDF o imagen utilizando OCR.
+    Texto embebido (capa de texto) de un PDF, leído página por página: el texto
+    de una página se extrae la primera vez que se pide, así quien deja de
+    iterar después de las primeras páginas no paga por el resto del documento.
+    Si el PDF no se puede leer, se comporta como un PDF sin páginas.
+    """
+
+    def __init__(self, file_path):
+        self._textos = {}
+        try:
+            self._archivo = open(file_path, "rb")
+            self._pdf = PyPDF2.PdfReader(self._archivo)
+            self._numero_paginas = len(self._pdf.pages)
+        except Exception:
+            self.cerrar()
+            self._pdf = None
+            self._numero_paginas = 0
+
+    def __len__(self):
+        return self._numero_paginas
+
+    def texto(self, indice):
+        """
+        Texto de la página indicada (numeradas desde 0), cadena vacía si la
+        página no tiene capa de texto o no se pudo leer.
+        """
+        if indice not in self._textos:
+            try:
+                self._textos[indice] = self._pdf.pages[indice].extract_text() or ""
+            except Exception:
+                self._textos[indice] = ""
+        return self._textos[indice]
+
+    def cerrar(self):
+        archivo = getattr(self, "_archivo", None)
+        if archivo is not None:
+            archivo.close()
+            self._archivo = None
+
+
+def extraer_capa_texto(file_path):
+    """
+    Lee el texto embebido (capa de texto) de cada página de un PDF.
 
     Parámetros:
-    file_path (str): Ruta del archivo (PDF o imagen).
+    file_path (str): Ruta del archivo PDF.
+
+    Retorna:
+    list: Texto de cada página, cadena vacía si la página no tiene capa de texto.
+    """
+    capa = CapaTextoPDF(file_path)
+    try:
+        return [capa.texto(i) for i in range(len(capa))]
+    finally:
+        capa.cerrar()
+
+
+def texto_es_utilizable(texto):
+    """
+    Indica si el texto de la capa embebida sirve o si la página debe pasar por OCR.
+    Descarta páginas casi vacías y las que solo traen glifos sin mapear.
+    """
+    caracteres = "".join(texto.split())
+    if len(caracteres) < OCR["min_caracteres_capa_texto"]:
+        return False
+    alfanumericos = sum(1 for c in caracteres if c.isalnum())
+    return alfanumericos / len(caracteres) >= OCR["min_proporcion_alfanumerica"]
+
+
+def funcion_ocr_layout():
+    """
+    Retorna la función de OCR según OCR["modo_ocr"]: la página completa o solo
+    sus regiones de texto (con perfil numérico para montos, fechas y cédulas).
+    """
+    if OCR["modo_ocr"] == "regiones":
+        return ocr_layout_por_regiones
+    if OCR["modo_ocr"] == "pagina":
+        return motores_ocr.ocr_layout
+    raise ValueError(f"Modo de OCR no soportado: {OCR['modo_ocr']}")
+
+
+def preparar_pagina(paginas, indice, perfil):
+    """
+    Preprocesa una página del documento según el perfil de OCR.
+
+    La escala se elige para que el texto quede del tamaño que espera el perfil:
+    en los PDF a partir del tamaño de la página y en las imágenes (fotos de
+    celular) a partir de la altura estimada de los caracteres. La orientación y
+    la inclinación se calculan una sola vez por página y quedan guardadas en `paginas`.
+
+    En los PDF, si el perfil pide más DPI que los de `paginas` (por ejemplo el
+    perfil "preciso", a 300 DPI, con las páginas compartidas del análisis visual,
+    a 200), la página se vuelve a rasterizar a los DPI del perfil (en escala de
+    grises si el perfil lo pide) en vez de ampliar la imagen compartida, que no
+    recupera el detalle. Si pide menos, se reduce la imagen compartida.
 
     Retorna:
-    str: Texto extraído del archivo.
+    tuple: (imagen preprocesada, matriz afín hacia coordenadas de la página,
+        ancho y alto de la página).
     """
-    text = ""
+    imagen = paginas.pagina_rgb(indice)
+    gris = imagen if imagen.ndim == 2 else cv2.cvtColor(imagen, cv2.COLOR_RGB2GRAY)
+    alto, ancho = gris.shape
+    if paginas.es_pdf:
+        ancho_pt = ancho * 72 / paginas.dpi
+        dpi = preprocesamiento.dpi_para_pagina(ancho_pt, perfil)
+        escala = dpi / paginas.dpi
+    else:
+        escala = preprocesamiento.escala_para_imagen(gris, perfil)
+    geometria = None
+    if perfil["corregir_orientacion"] or perfil["enderezar"]:
+        # Los ángulos no dependen de la resolución: se miden en la página compartida
+        clave = (perfil["corregir_orientacion"], perfil["enderezar"], perfil["max_inclinacion"])
+        geometria = paginas.geometria(
+            indice, clave, lambda: preprocesamiento.calcular_geometria(gris, perfil)
+        )
+    if paginas.es_pdf and escala > 1.01:
+        render = renderizar_pagina_pdf(
+            paginas.file_path, indice + 1, dpi=dpi, escala_grises=perfil["escala_grises"]
+        )
+        fuente = np.asarray(render.convert("L"))
+        preprocesada, matriz = preprocesamiento.preprocesar(fuente, perfil, 1.0, geometria)
+        # Coordenadas del render a coordenadas de la página de `paginas`
+        matriz = np.float32(matriz) * np.float32([[ancho / fuente.shape[1]], [alto / fuente.shape[0]]])
+        return preprocesada, matriz, ancho, alto
+    preprocesada, matriz = preprocesamiento.preprocesar(gris, perfil, escala, geometria)
+    return preprocesada, matriz, ancho, alto
+
+
+def pagina_ocr(numero, layout):
+    """
+    Arma el resultado de una página procesada con OCR a partir de su layout.
+    """
+    return {
+        "pagina": numero,
+        "metodo": "ocr",
+        "texto": layout.texto(),
+        "layout": layout.a_dict()
+    }
+
+
+def iterar_ocr_paginas(paginas, numeros_pagina):
+    """
+    Aplica OCR a las páginas indicadas repartiéndolas en el pool persistente de
+    procesos de OCR y entrega los resultados en orden a medida que se consumen.
+
+    Las páginas se rasterizan y preprocesan en este proceso de una en una y nunca
+    hay más de OCR["max_paginas_en_vuelo"] imágenes esperando resultado, para
+    acotar la memoria. Si quien consume deja de iterar, las páginas que no
+    alcanzaron a empezar se cancelan.
+
+    Parámetros:
+    paginas (PaginasDocumento): Páginas del documento.
+    numeros_pagina (iterable): Páginas a procesar (numeradas desde 1); puede ser
+        un generador, que se consume solo a medida que hay lugar en vuelo.
+
+    Retorna:
+    generator: Tuplas (numero_pagina, LayoutOCR) en el orden de numeros_pagina,
+        con las cajas en coordenadas de la página de `paginas`.
+    """
+    if not numeros_pagina:
+        return
+
+    perfil = preprocesamiento.obtener_perfil()
+    ocr_layout = funcion_ocr_layout()
+    if OCR["procesos"] == 1:
+        for numero in numeros_pagina:
+            imagen, matriz, ancho, alto = preparar_pagina(paginas, numero - 1, perfil)
+            yield numero, ocr_layout(imagen).transformar(matriz, ancho, alto)
+        return
+
+    max_en_vuelo = max(1, OCR["max_paginas_en_vuelo"])
+    pool = motores_ocr.obtener_pool()
+    motor = motores_ocr.motor_configurado()
+    pendientes = deque()
+    siguientes = iter(numeros_pagina)
+    try:
+        while True:
+            for numero in siguientes:
+                imagen, matriz, ancho, alto = preparar_pagina(paginas, numero - 1, perfil)
+                futuro = pool.submit(ocr_layout, imagen, motor)
+                pendientes.append((numero, futuro, matriz, ancho, alto))
+                if len(pendientes) >= max_en_vuelo:
+                    break
+            if not pendientes:
+                break
+            numero, futuro, matriz, ancho, alto = pendientes.popleft()
+            yield numero, futuro.result().transformar(matriz, ancho, alto)
+    except BrokenProcessPool:
+        # Un proceso murió: se descarta el pool para que la próxima llamada cree uno nuevo
+        motores_ocr.cerrar_pool()
+        raise
+    finally:
+        for pendiente in pendientes:
+            pendiente[1].cancel()
+
+
+def parametros_ocr(usar_capa_texto=None):
+    """
+    Retorna los parámetros que afectan el texto extraído. Se usan como parte de
+    la clave de la caché de OCR.
+    """
+    if usar_capa_texto is None:
+        usar_capa_texto = OCR["usar_capa_texto"]
+    return {
+        "formato": "layout",
+        "perfil": OCR["perfil"],
+        "preprocesamiento": preprocesamiento.obtener_perfil(),
+        "usar_capa_texto": usar_capa_texto,
+        "min_caracteres_capa_texto": OCR["min_caracteres_capa_texto"],
+        "min_proporcion_alfanumerica": OCR["min_proporcion_alfanumerica"],
+        "motor": motores_ocr.motor_configurado(),
+        "modo_ocr": OCR["modo_ocr"],
+        "lang": OCR["lang"]
+    }
+
+
+def iterar_texto_paginas(file_path, usar_capa_texto=None, paginas=None, desde=1):
+    """
+    Extrae el texto página por página registrando el método usado en cada una.
+
+    Es un generador: cada página se rasteriza y se procesa solo cuando se pide,
+    de modo que quien consume puede detenerse después de las primeras páginas
+    (por ejemplo, para clasificar el documento) sin pagar por el resto.
+
+    Parámetros:
+    file_path (str): Ruta del archivo (PDF, DOCX o imagen).
+    usar_capa_texto (bool): Si es True, en los PDF se usa la capa de texto embebida
+        y solo se hace OCR de las páginas sin texto utilizable. Por defecto se toma
+        de OCR["usar_capa_texto"].
+    paginas (PaginasDocumento): Páginas ya rasterizadas del documento, compartidas
+        con el análisis visual.
+    desde (int): Primera página a entregar (numerada desde 1), para continuar
+        una extracción que se cortó antes.
+
+    Retorna:
+    generator: Diccionarios con "pagina", "metodo" ("capa_texto", "ocr" o "docx"),
+        "texto" y "layout" (LayoutOCR serializado con a_dict, solo en páginas con OCR).
+    """
+    if usar_capa_texto is None:
+        usar_capa_texto = OCR["usar_capa_texto"]
+    if paginas is None and not file_path.endswith(".docx"):
+        # Sin páginas compartidas se rasteriza directamente como pide el perfil
+        perfil = preprocesamiento.obtener_perfil()
+        paginas = PaginasDocumento(file_path, dpi=perfil["dpi"], escala_grises=perfil["escala_grises"])
 
     if file_path.endswith(".pdf"):
-        # Convertir PDF a imágenes y extraer texto
-        images = pdf2image.convert_from_path(file_path, poppler_path="/usr/local/bin")
-        for image in images:
-            text += pytesseract.image_to_string(image, lang="eng")
+        # La capa de texto se lee página por página a medida que se avanza; el
+        # OCR solo mira hacia adelante las páginas que tiene en vuelo
+        capa = CapaTextoPDF(file_path) if usar_capa_texto else None
+        numero_paginas = len(capa) if capa else len(paginas)
+
+        def usa_capa(numero):
+            return capa is not None and numero <= len(capa) and texto_es_utilizable(capa.texto(numero - 1))
+
+        layouts_ocr = iterar_ocr_paginas(
+            paginas, (n for n in range(desde, numero_paginas + 1) if not usa_capa(n))
+        )
+        try:
+            for numero in range(desde, numero_paginas + 1):
+                if usa_capa(numero):
+                    texto = capa.texto(numero - 1) + "\n"
+                    yield {"pagina": numero, "metodo": "capa_texto", "texto": texto, "layout": None}
+                else:
+                    _, layout = next(layouts_ocr)
+                    yield pagina_ocr(numero, layout)
+        finally:
+            layouts_ocr.close()
+            if capa is not None:
+                capa.cerrar()
+    elif desde > 1:
+        # Los DOCX y las imágenes son una sola página
+        return
     elif file_path.endswith(".docx"):
-        #
         doc = Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-
+        text = "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
+        yield {"pagina": 1, "metodo": "docx", "texto": text, "layout": None}
     else:
         # Extraer texto directamente de la imagen
-        text = pytesseract.image_to_string(Image.open(file_path), lang="eng")
-
-    return text
+        _, layout = next(iterar_ocr_paginas(paginas, [1]))
+        yield pagina_ocr(1, layout)
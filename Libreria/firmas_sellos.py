@@ -0,0 +1,319 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from libreria.config import VISUAL
+
+CLASES = ("sello", "firma")
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def descriptor_forma(binaria):
+    """
+    Descriptor de forma de un candidato (recorte binario, trazo = 255): relación
+    de aspecto, ocupación del trazo, proporción de huecos y los primeros momentos
+    de Hu. Los sellos son anillos o marcos casi cuadrados con un hueco grande; las
+    firmas son trazos alargados, con poca tinta y huecos pequeños.
+    """
+    alto, ancho = binaria.shape
+    tinta = cv2.countNonZero(binaria)
+    relleno = cv2.copyMakeBorder(binaria, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    cv2.floodFill(relleno, None, (0, 0), 128)
+    lleno = cv2.countNonZero(cv2.compare(relleno, 128, cv2.CMP_NE))
+    hu = cv2.HuMoments(cv2.moments(binaria, binaryImage=True)).ravel()[:4]
+    hu = -np.sign(hu) * np.log10(np.abs(hu) + 1e-30)
+    return np.concatenate([[
+        np.log(ancho / alto),
+        tinta / float(ancho * alto),
+        (lleno - tinta) / float(max(lleno, 1))
+    ], np.clip(hu, 0, 30) / 10])
+
+
+def _plantillas_sinteticas():
+    """
+    Plantillas de referencia dibujadas: sellos circulares, ovalados y
+    rectangulares (con texto interior simulado) y firmas manuscritas simuladas.
+    """
+    plantillas = []
+    # Sellos circulares sencillos y dobles (radio del anillo interior relativo al exterior)
+    for radio, grosor, interior in (
+        (50, 2, None), (60, 3, None), (70, 3, 0.8), (80, 4, 0.75), (90, 2, None), (100, 3, 0.85)
+    ):
+        lienzo = np.zeros((2 * radio + 20, 2 * radio + 20), np.uint8)
+        centro = (radio + 10, radio + 10)
+        cv2.circle(lienzo, centro, radio, 255, grosor)
+        if interior:
+            cv2.circle(lienzo, centro, int(radio * interior), 255, grosor)
+        cv2.putText(lienzo, "NIT", (centro[0] - 25, centro[1] + 8), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 255, 2)
+        plantillas.append(("sello", lienzo))
+    lienzo = np.zeros((120, 200), np.uint8)
+    cv2.ellipse(lienzo, (100, 60), (90, 50), 0, 0, 360, 255, 3)
+    cv2.putText(lienzo, "RECIBIDO", (40, 68), cv2.FONT_HERSHEY_SIMPLEX, 0.7, 255, 2)
+    plantillas.append(("sello", lienzo))
+    lienzo = np.zeros((100, 240), np.uint8)
+    cv2.rectangle(lienzo, (5, 5), (234, 94), 255, 3)
+    cv2.putText(lienzo, "PAGADO", (50, 62), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 255, 2)
+    plantillas.append(("sello", lienzo))
+
+    # Firmas: trazos ondulados y trazos continuos con bucles (cursiva de un solo trazo)
+    rng = np.random.default_rng(7)
+    for k in range(12):
+        ancho = int(rng.integers(160, 320))
+        alto = int(ancho / rng.uniform(2.5, 5))
+        t = np.linspace(0, 1, 600)
+        x = 10 + t * (ancho - 20)
+        if k % 2 == 0:
+            y = alto / 2
+            for _ in range(3):
+                y = y + alto * rng.uniform(0.1, 0.3) * np.sin(2 * np.pi * (rng.uniform(2, 6) * t + rng.uniform()))
+            x = x + 8 * np.sin(2 * np.pi * 9 * t)
+        else:
+            vueltas = rng.uniform(4, 9)
+            x = x + alto * rng.uniform(0.15, 0.3) * np.cos(2 * np.pi * vueltas * t)
+            y = alto / 2 + alto * 0.3 * np.sin(2 * np.pi * vueltas * t)
+        puntos = np.stack([np.clip(x, 0, ancho - 1), y], axis=1).astype(np.int32)
+        lienzo = np.zeros((alto + 20, ancho), np.uint8)
+        cv2.polylines(lienzo, [puntos + [0, 10]], False, 255, 2)
+        plantillas.append(("firma", lienzo))
+    return plantillas
+
+
+def _plantillas_directorio(directorio):
+    """
+    Plantillas reales recortadas de documentos: archivos "sello_*.png" y
+    "firma_*.png" del directorio (trazo oscuro sobre fondo claro).
+    """
+    plantillas = []
+    if not directorio or not os.path.isdir(directorio):
+        return plantillas
+    for nombre in sorted(os.listdir(directorio)):
+        clase = nombre.split("_", 1)[0]
+        if clase not in CLASES:
+            continue
+        gris = cv2.imread(os.path.join(directorio, nombre), cv2.IMREAD_GRAYSCALE)
+        if gris is not None:
+            _, binaria = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+            plantillas.append((clase, binaria))
+    return plantillas
+
+
+class IndicePlantillas:
+    """
+    Índice de descriptores de las plantillas conocidas de sellos y firmas. Se
+    arma una sola vez por proceso (ver obtener_indice) y la comparación de todos
+    los candidatos de una página contra todas las plantillas es una sola
+    operación matricial.
+    """
+
+    def __init__(self, plantillas):
+        self.clases = np.asarray([clase for clase, _ in plantillas])
+        descriptores = np.stack([descriptor_forma(binaria) for _, binaria in plantillas])
+        self.media = descriptores.mean(axis=0)
+        # Piso de la escala: un rasgo casi constante en las plantillas no debe
+        # disparar la distancia de cualquier candidato que se aparte un poco
+        self.escala = np.maximum(descriptores.std(axis=0), 0.05)
+        self.descriptores = (descriptores - self.media) / self.escala
+
+    def clasificar(self, descriptores, distancia_max):
+        """
+        Clase de la plantilla más cercana a cada descriptor, o None si ninguna
+        está a menos de `distancia_max` (en desviaciones estándar).
+        """
+        if not len(descriptores):
+            return []
+        normalizados = (np.asarray(descriptores) - self.media) / self.escala
+        distancias = np.linalg.norm(normalizados[:, None, :] - self.descriptores[None, :, :], axis=2)
+        cercana = distancias.argmin(axis=1)
+        minima = distancias[np.arange(len(cercana)), cercana]
+        return [
+            str(self.clases[j]) if d <= distancia_max else None
+            for j, d in zip(cercana, minima)
+        ]
+
+
+def obtener_indice():
+    """
+    Retorna el índice de plantillas del proceso, creándolo la primera vez.
+    """
+    global _indice
+    with _indice_lock:
+        if _indice is None:
+            plantillas = _plantillas_sinteticas() + _plantillas_directorio(VISUAL["plantillas_directorio"])
+            _indice = IndicePlantillas(plantillas)
+        return _indice
+
+
+def regiones_busqueda(ancho, alto, layout=None, escala=1.0):
+    """
+    Regiones donde se buscan firmas y sellos, como cajas (x0, y0, x1, y1): el
+    tercio inferior de la página y el entorno de las palabras ancla del OCR
+    ("Atentamente", "Firma", ...). Las cajas del layout se llevan a la escala
+    de la imagen analizada.
+    """
+    regiones = [(0, int(alto * VISUAL["region_firmas_desde"]), ancho, alto)]
+    if layout is not None and len(layout):
+        for i in layout.buscar(VISUAL["anclas_firma"]):
+            x, y, w, h = (layout.cajas[i] * escala).astype(int)
+            regiones.append((
+                max(0, x - w), max(0, y - 6 * h),
+                min(ancho, x + 4 * w), min(alto, y + 10 * h)
+            ))
+    return regiones
+
+
+def lineas_texto(stats, centros, escala=1.0):
+    """
+    Cajas (x, y, ancho, alto) de las líneas de texto armadas sin OCR: los
+    componentes con alto de letra se unen en horizontal (tanto como el alto
+    típico de la letra, que cubre el espacio entre palabras) y se conservan los
+    grupos de al menos VISUAL["letras_min_linea"] letras. Complementan a las
+    palabras del layout y las reemplazan cuando la página no tiene OCR (capa de
+    texto del PDF o análisis visual por lote).
+
+    Parámetros:
+    stats (numpy.ndarray): Estadísticas de cv2.connectedComponentsWithStats de
+        los componentes, sin el fondo.
+    centros (numpy.ndarray): Centroides de los mismos componentes.
+    escala (float): Escala de la imagen respecto a la página completa.
+
+    Retorna:
+    numpy.ndarray: Arreglo (N, 4) con las cajas de las líneas.
+    """
+    alto_min, alto_max = VISUAL["alto_letra"]
+    ancho, alto = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    letras = (alto >= alto_min * escala) & (alto <= alto_max * escala) & (ancho <= 3 * alto)
+    if letras.sum() < VISUAL["letras_min_linea"]:
+        return np.zeros((0, 4), np.int32)
+    cajas, centros = stats[letras, :4], centros[letras].astype(int)
+
+    lienzo = np.zeros((int((cajas[:, 1] + cajas[:, 3]).max()), int((cajas[:, 0] + cajas[:, 2]).max())), np.uint8)
+    for x, y, w, h in cajas:
+        lienzo[y:y + h, x:x + w] = 255
+    paso = max(3, int(np.median(cajas[:, 3])))
+    lienzo = cv2.dilate(lienzo, cv2.getStructuringElement(cv2.MORPH_RECT, (paso, 1)))
+    n, etiquetas, lineas, _ = cv2.connectedComponentsWithStats(lienzo, connectivity=8)
+    cuenta = np.bincount(etiquetas[centros[:, 1], centros[:, 0]], minlength=n)
+    return lineas[1:, :4][cuenta[1:] >= VISUAL["letras_min_linea"]]
+
+
+def _fraccion_cubierta(cajas, palabras):
+    """
+    Fracción del área de cada caja (x, y, ancho, alto) cubierta por las cajas
+    de `palabras`.
+    """
+    c0, c1 = cajas[:, None, :2], cajas[:, None, :2] + cajas[:, None, 2:]
+    p0, p1 = palabras[None, :, :2], palabras[None, :, :2] + palabras[None, :, 2:]
+    interseccion = np.clip(np.minimum(c1, p1) - np.maximum(c0, p0), 0, None)
+    return interseccion.prod(axis=2).sum(axis=1) / (cajas[:, 2] * cajas[:, 3])
+
+
+def _sin_anidadas(cajas):
+    """
+    Descarta las cajas (x, y, ancho, alto) contenidas en otra caja, como el anillo
+    interior de un sello doble que la dilatación no alcanza a unir con el exterior
+    (a escala de miniatura sí se unen): así el sello cuenta una sola vez a
+    cualquier escala.
+    """
+    if len(cajas) < 2:
+        return cajas
+    x0, y0 = cajas[:, 0], cajas[:, 1]
+    x1, y1 = x0 + cajas[:, 2], y0 + cajas[:, 3]
+    dentro = (
+        (x0[:, None] >= x0[None, :]) & (y0[:, None] >= y0[None, :])
+        & (x1[:, None] <= x1[None, :]) & (y1[:, None] <= y1[None, :])
+    )
+    # De dos cajas iguales se conserva la primera
+    iguales = dentro & dentro.T
+    dentro &= ~iguales | np.tri(len(cajas), k=-1, dtype=bool)
+    return cajas[~dentro.any(axis=1)]
+
+
+def _unir_firmas(cajas):
+    """
+    Une las cajas de firma vecinas de un mismo renglón: una firma de varios trazos
+    (nombre y rúbrica, iniciales separadas) queda en varios candidatos cuando
+    los trazos están más lejos de lo que une la dilatación. Se unen las cajas
+    que se solapan en al menos la mitad del alto menor y están separadas en
+    horizontal menos que el alto mayor.
+    """
+    cajas = [list(caja) for caja in cajas[np.argsort(cajas[:, 0])]] if len(cajas) else []
+    unidas = []
+    for x, y, w, h in cajas:
+        for caja in unidas:
+            ux, uy, uw, uh = caja
+            solape = min(y + h, uy + uh) - max(y, uy)
+            separacion = x - (ux + uw)
+            if solape >= min(h, uh) / 2 and separacion <= max(h, uh):
+                x0, y0 = min(x, ux), min(y, uy)
+                caja[:] = [x0, y0, max(x + w, ux + uw) - x0, max(y + h, uy + uh) - y0]
+                break
+        else:
+            unidas.append([x, y, w, h])
+    return np.asarray(unidas, dtype=np.int32).reshape(-1, 4)
+
+
+def detectar_firmas_sellos(pagina, layout=None, escala=1.0):
+    """
+    Detecta firmas y sellos solo dentro de las regiones probables de la página.
+
+    Primero se descarta el moteado del papel que deja la binarización adaptativa
+    (componentes de menos de VISUAL["area_min_trazo"] píxeles a escala
+    completa). Los trazos de cada región se agrupan con una dilatación pequeña
+    (una firma suele tener varios trazos separados) y se descartan los
+    candidatos pequeños (menos de 50x20 píxeles a escala completa), los que
+    tocan el borde de la página (fondos decorativos que salen de ella) y los que
+    son texto: cubiertos por palabras que el OCR leyó con confianza o por líneas
+    de texto armadas con los mismos componentes (ver lineas_texto), así también
+    se filtran sin OCR. De los candidatos anidados se conserva el exterior (ver
+    _sin_anidadas). Cada candidato restante se clasifica contra el índice de
+    plantillas y las firmas vecinas de un mismo renglón se unen (ver _unir_firmas).
+
+    Parámetros:
+    pagina (CaracteristicasPagina): Página (o miniatura) a analizar.
+    layout (LayoutOCR): Layout de la página en coordenadas de la página completa.
+    escala (float): Escala de `pagina` respecto a la página completa.
+
+    Retorna:
+    dict: "firmas" y "sellos", arreglos (N, 4) int32 de cajas (x, y, ancho, alto)
+        en coordenadas de la página completa.
+    """
+    binaria = pagina.umbral_adaptativo
+    alto, ancho = binaria.shape
+    mascara = np.zeros_like(binaria)
+    for x0, y0, x1, y1 in regiones_busqueda(ancho, alto, layout, escala):
+        mascara[y0:y1, x0:x1] = 255
+    trazos = cv2.bitwise_and(binaria, mascara)
+    _, etiquetas, stats, centros = cv2.connectedComponentsWithStats(trazos, connectivity=8)
+    utiles = stats[:, cv2.CC_STAT_AREA] >= VISUAL["area_min_trazo"] * escala ** 2
+    utiles[0] = False
+    trazos = np.uint8(utiles[etiquetas]) * 255
+
+    lado = max(3, int(round(9 * escala)) | 1)
+    unidos = cv2.dilate(trazos, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (lado, lado)))
+    _, _, candidatos, _ = cv2.connectedComponentsWithStats(unidos, connectivity=8)
+    cajas = candidatos[1:, :4]
+    cajas = cajas[(cajas[:, 2] > 50 * escala) & (cajas[:, 3] > 20 * escala)]
+    cajas = cajas[(cajas[:, 2] < ancho * 0.6) & (cajas[:, 3] < alto * 0.3)]
+    cajas = cajas[
+        (cajas[:, 0] > 0) & (cajas[:, 1] > 0)
+        & (cajas[:, 0] + cajas[:, 2] < ancho) & (cajas[:, 1] + cajas[:, 3] < alto)
+    ]
+
+    lineas = lineas_texto(stats[utiles], centros[utiles], escala)
+    if len(lineas) and len(cajas):
+        cajas = cajas[_fraccion_cubierta(cajas, lineas) < 0.5]
+    if layout is not None and len(layout) and len(cajas):
+        # Se descartan los candidatos cubiertos por palabras que el OCR leyó con confianza
+        palabras = layout.cajas[layout.confianzas >= 60] * escala
+        cajas = cajas[_fraccion_cubierta(cajas, palabras) < 0.5]
+
+    cajas = _sin_anidadas(cajas)
+    descriptores = [descriptor_forma(trazos[y:y + h, x:x + w]) for x, y, w, h in cajas]
+    clases = obtener_indice().clasificar(descriptores, VISUAL["distancia_max_plantilla"])
+    clases = np.asarray(clases, dtype=object)
+    cajas = np.round(cajas / escala).astype(np.int32).reshape(-1, 4)
+    return {"firmas": _unir_firmas(cajas[clases == "firma"]), "sellos": cajas[clases == "sello"]}
@@ -0,0 +1,323 @@
+import cv2
+import numpy as np
+
+from libreria.config import FRAUDE
+
+# Separación en píxeles entre las palabras pegadas en la tira
+SEPARACION_TIRA = 3
+
+
+def _vacio(lado, descartadas=0):
+    return {
+        "huellas": np.zeros((0, lado * lado), dtype=np.float32),
+        "digitos": np.zeros(0, dtype="<U1"),
+        "cajas": np.zeros((0, 4), dtype=np.int32),
+        "palabras": np.zeros(0, dtype=object),
+        "altura_relativa": np.zeros(0, dtype=np.float32),
+        "base_relativa": np.zeros(0, dtype=np.float32),
+        "altura_linea": np.zeros(0, dtype=np.float32),
+        "trazo_linea": np.zeros(0, dtype=np.float32),
+        "palabras_descartadas": descartadas
+    }
+
+
+def _tira_palabras(gris, cajas):
+    """
+    Pega los recortes de las palabras uno al lado del otro en una sola tira
+    (fondo blanco), así la binarización y los componentes conectados de todas
+    las palabras de la página son una sola operación cuyo costo depende del
+    área de las palabras y no del de la página.
+
+    Retorna:
+    tuple: (tira, inicio de cada palabra en la tira en x).
+    """
+    anchos = cajas[:, 2]
+    inicios = np.concatenate([[0], np.cumsum(anchos + SEPARACION_TIRA)[:-1]])
+    tira = np.full((int(cajas[:, 3].max()), int(inicios[-1] + anchos[-1])), 255, dtype=np.uint8)
+    for (x, y, w, h), inicio in zip(cajas, inicios):
+        tira[:h, inicio:inicio + w] = gris[y:y + h, x:x + w]
+    return tira, inicios
+
+
+def _muestrear(imagen, xs, ys):
+    """
+    Valores de `imagen` en las coordenadas (xs, ys), de cualquier forma, con
+    interpolación bilineal. Las coordenadas fuera de la imagen toman el borde.
+    """
+    alto, ancho = imagen.shape
+    xs = np.clip(xs, 0, ancho - 1)
+    ys = np.clip(ys, 0, alto - 1)
+    x0 = np.minimum(np.floor(xs).astype(np.intp), ancho - 2) if ancho > 1 else np.zeros(xs.shape, np.intp)
+    y0 = np.minimum(np.floor(ys).astype(np.intp), alto - 2) if alto > 1 else np.zeros(ys.shape, np.intp)
+    fx = np.clip(xs - x0, 0, 1)
+    fy = np.clip(ys - y0, 0, 1)
+    x1 = np.minimum(x0 + 1, ancho - 1)
+    y1 = np.minimum(y0 + 1, alto - 1)
+    imagen = imagen.astype(np.float32)
+    arriba = imagen[y0, x0] * (1 - fx) + imagen[y0, x1] * fx
+    abajo = imagen[y1, x0] * (1 - fx) + imagen[y1, x1] * fx
+    return arriba * (1 - fy) + abajo * fy
+
+
+def _por_palabra(valores, palabra, rango, funcion):
+    """
+    Aplica `funcion` (np.nanmedian, ...) a los valores de cada palabra de una
+    vez: los valores se ordenan en una matriz palabra x posición rellena con NaN.
+    """
+    matriz = np.full((int(palabra.max()) + 1, int(rango.max()) + 1), np.nan, dtype=np.float64)
+    matriz[palabra, rango] = valores
+    return funcion(matriz, axis=1)
+
+
+def _alturas_lineas(layout, numericas, alto_pagina):
+    """
+    Altura de cada línea del layout en píxeles de la página: la mediana de sus
+    palabras no numéricas, o la de todas las palabras de texto de la página si
+    la línea solo tiene números. Así un monto reescrito más grande no cambia la
+    altura de la línea con la que se compara.
+    """
+    alturas = layout.cajas[:, 3] * alto_pagina / layout.alto
+    texto = ~numericas
+    referencia = float(np.median(alturas[texto] if texto.any() else alturas))
+    con_texto = np.bincount(layout.lineas, weights=texto) > 0
+    alturas = np.where(texto, alturas, np.where(con_texto[layout.lineas], np.nan, referencia))
+    orden = np.argsort(layout.lineas, kind="stable")
+    lineas = layout.lineas[orden]
+    rango = np.arange(len(orden)) - np.searchsorted(lineas, lineas)
+    return _por_palabra(alturas[orden], lineas, rango, np.nanmedian)
+
+
+def extraer_glifos(pagina, layout):
+    """
+    Recorta los dígitos de las palabras numéricas de la página (montos, cuentas,
+    fechas sin separadores) y calcula su huella.
+
+    Tesseract entrega cajas por palabra, no por carácter: las palabras que
+    coinciden con FRAUDE["glifos_patron"] se pegan en una tira (ver
+    _tira_palabras), se binarizan con Otsu y cada componente conectado es un
+    carácter. Si una palabra tiene tantos componentes como caracteres su texto,
+    cada componente recibe el carácter que le corresponde por orden; si no
+    (caracteres unidos o partidos) la palabra se descarta.
+
+    La huella de un dígito es su trazo muestreado en una cuadrícula de
+    FRAUDE["glifos_lado"] x FRAUDE["glifos_lado"] sobre un cuadrado centrado en
+    su trazo, así no depende del tamaño. Además se mide la altura y la línea base
+    de cada dígito respecto a la mediana de los dígitos de su palabra (NaN si la
+    palabra tiene menos de tres dígitos) y, para comparar con el resto del
+    documento, la altura y el grosor del trazo de cada dígito divididos por la
+    altura de su línea (ver _alturas_lineas): un monto reescrito entero en
+    otro tamaño o con un trazo más grueso no se ve dentro de su palabra. El
+    grosor es el doble del área del trazo sobre su contorno.
+
+    Parámetros:
+    pagina (CaracteristicasPagina): Página a analizar.
+    layout (LayoutOCR): Layout de la página, en coordenadas de la página completa.
+
+    Retorna:
+    dict: Arreglos por dígito: "huellas" (N, lado * lado), "digitos",
+        "cajas" (x, y, ancho, alto en coordenadas de la página), "palabras"
+        (texto de la palabra), "altura_relativa", "base_relativa",
+        "altura_linea" y "trazo_linea"; y "palabras_descartadas", el número de
+        palabras numéricas cuyos componentes no coinciden con su texto.
+    """
+    lado = FRAUDE["glifos_lado"]
+    if layout is None or not len(layout):
+        return _vacio(lado)
+    indices = layout.buscar(FRAUDE["glifos_patron"])
+    numericas = np.zeros(len(layout), dtype=bool)
+    numericas[indices] = True
+    gris = pagina.gris
+    alto, ancho = gris.shape
+    factor = np.array([ancho / layout.ancho, alto / layout.alto] * 2)
+    cajas = np.round(layout.cajas[indices] * factor).astype(np.int64).reshape(-1, 4)
+    # Un píxel de margen para no cortar el trazo, sin salir de la página
+    x0 = np.clip(cajas[:, 0] - 1, 0, ancho)
+    y0 = np.clip(cajas[:, 1] - 1, 0, alto)
+    x1 = np.clip(cajas[:, 0] + cajas[:, 2] + 1, 0, ancho)
+    y1 = np.clip(cajas[:, 1] + cajas[:, 3] + 1, 0, alto)
+    cajas = np.stack([x0, y0, x1 - x0, y1 - y0], axis=1)
+    validas = (cajas[:, 2] > 0) & (cajas[:, 3] >= FRAUDE["glifos_altura_min"])
+    cajas, indices = cajas[validas], indices[validas]
+    if not len(cajas):
+        return _vacio(lado)
+
+    altura_linea = _alturas_lineas(layout, numericas, alto)[layout.lineas[indices]]
+
+    tira, inicios = _tira_palabras(gris, cajas)
+    _, binaria = cv2.threshold(tira, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    _, etiquetas, stats, centros = cv2.connectedComponentsWithStats(binaria, connectivity=8)
+    # Contorno de cada componente: los píxeles del trazo que la erosión elimina
+    contorno = (binaria > 0) & (cv2.erode(binaria, np.ones((3, 3), np.uint8)) == 0)
+    perimetro = np.bincount(etiquetas[contorno], minlength=len(stats))
+    # Se ignoran las motas de uno o dos píxeles
+    conservar = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] > 2) + 1
+    stats, centros, perimetro = stats[conservar], centros[conservar], perimetro[conservar]
+    palabra = np.searchsorted(inicios, stats[:, 0], side="right") - 1
+    orden = np.lexsort((stats[:, 0], palabra))
+    stats, centros, palabra, perimetro = stats[orden], centros[orden], palabra[orden], perimetro[orden]
+
+    # Carácter de cada componente, en las palabras con un componente por carácter
+    textos = [layout.palabras[i] for i in indices]
+    longitudes = np.array([len(t) for t in textos])
+    caracteres = np.array(list("".join(textos)))
+    primero = np.searchsorted(palabra, np.arange(len(textos)))
+    cuenta = np.bincount(palabra, minlength=len(textos))
+    posicion = np.arange(len(palabra)) - primero[palabra]
+    alineada = (cuenta == longitudes)[palabra]
+    descartadas = int(np.count_nonzero(cuenta != longitudes))
+    inicio_texto = np.concatenate([[0], np.cumsum(longitudes)[:-1]])
+    caracter = np.where(
+        alineada, caracteres[np.minimum(inicio_texto[palabra] + posicion, len(caracteres) - 1)], ""
+    )
+    digito = np.char.isdigit(caracter)
+    if not digito.any():
+        return _vacio(lado, descartadas)
+    stats, centros, palabra, caracter = stats[digito], centros[digito], palabra[digito], caracter[digito]
+    x, y, w, h = (stats[:, i].astype(np.float64) for i in range(4))
+    trazo = 2 * stats[:, cv2.CC_STAT_AREA] / np.maximum(perimetro[digito], 1)
+
+    # Altura y línea base respecto a los demás dígitos de la palabra
+    _, palabra_densa = np.unique(palabra, return_inverse=True)
+    palabra_densa = palabra_densa.ravel()
+    rango = np.arange(len(palabra_densa)) - np.searchsorted(palabra_densa, palabra_densa)
+    altura = _por_palabra(h, palabra_densa, rango, np.nanmedian)[palabra_densa]
+    base = _por_palabra(y + h, palabra_densa, rango, np.nanmedian)[palabra_densa]
+    suficientes = np.bincount(palabra_densa)[palabra_densa] >= 3
+    altura_relativa = np.where(suficientes, h / altura - 1, np.nan)
+    base_relativa = np.where(suficientes, (y + h - base) / altura, np.nan)
+
+    # Huellas: todos los dígitos se muestrean de una vez sobre la tira,
+    # suavizada a la escala de la cuadrícula, en un cuadrado centrado en el
+    # centro de masa del trazo (con precisión subpíxel, así la posición del
+    # dígito respecto a la rejilla de píxeles no cambia la huella). Fuera de la
+    # caja del dígito cuenta como fondo, así no entra el vecino en el cuadrado
+    # de un dígito angosto como el 1
+    paso = np.maximum(w, h) / lado
+    suave = cv2.GaussianBlur(tira, (0, 0), max(0.5, float(np.median(paso)) / 2))
+    celdas = np.arange(lado) + 0.5
+    xs = (centros[:, 0] - lado / 2 * paso)[:, None] + celdas[None, :] * paso[:, None]
+    ys = (centros[:, 1] - lado / 2 * paso)[:, None] + celdas[None, :] * paso[:, None]
+    dentro = (xs >= x[:, None] - 1) & (xs <= (x + w)[:, None])
+    xs = np.broadcast_to(xs[:, None, :], (len(xs), lado, lado))
+    ys = np.broadcast_to(ys[:, :, None], (len(ys), lado, lado))
+    huellas = (255 - _muestrear(suave, xs, ys)) * dentro[:, None, :]
+    huellas = huellas.reshape(len(stats), -1)
+
+    # Cajas en coordenadas de la página
+    origen = cajas[palabra]
+    desplazamiento = origen[:, 0] - inicios[palabra]
+    cajas_digitos = np.stack([x + desplazamiento, y + origen[:, 1], w, h], axis=1).astype(np.int32)
+    return {
+        "huellas": huellas.astype(np.float32),
+        "digitos": caracter.astype("<U1"),
+        "cajas": cajas_digitos,
+        "palabras": np.array(textos, dtype=object)[palabra],
+        "altura_relativa": altura_relativa.astype(np.float32),
+        "base_relativa": base_relativa.astype(np.float32),
+        "altura_linea": (h / altura_linea[palabra]).astype(np.float32),
+        "trazo_linea": (trazo / altura_linea[palabra]).astype(np.float32),
+        "palabras_descartadas": descartadas
+    }
+
+
+def _distancias_huellas(huellas):
+    """
+    Matriz de distancias entre huellas (1 - correlación), calculada con un
+    producto de matrices. La correlación no depende del contraste del trazo,
+    que cambia con la tinta y el escaneo.
+    """
+    centradas = huellas - huellas.mean(axis=1, keepdims=True)
+    centradas /= np.maximum(np.linalg.norm(centradas, axis=1, keepdims=True), 1e-6)
+    return 1 - centradas @ centradas.T
+
+
+def glifos_atipicos(glifos_por_pagina):
+    """
+    Compara los dígitos de todas las páginas del documento y retorna los que no
+    se parecen a los demás.
+
+    Un dígito editado suele quedar en otra fuente, otro tamaño u otra línea
+    base. Los dígitos se agrupan por su valor (todos los "7" del documento) y
+    en cada grupo con al menos FRAUDE["glifos_min_por_digito"] ejemplares se
+    mide la distancia de cada huella a la más parecida del grupo: los dígitos
+    impresos con la misma fuente forman grupos de huellas casi iguales, y el
+    editado queda solo. Es atípico el dígito cuya distancia a su vecino más
+    cercano se aleja de la mediana del grupo más de tres desviaciones robustas,
+    contando al menos FRAUDE["glifos_desvio_forma"]. La correlación no ve el
+    grosor del trazo (la versión negrita de la misma fuente tiene casi la misma
+    huella), así que además se compara la tinta de cada huella, dividida por su
+    punto más oscuro para no depender del contraste, con la mediana del grupo:
+    es atípica si se aleja más de FRAUDE["glifos_tolerancia_grosor"], y su
+    grosor de trazo respecto a la altura de la línea ("trazo"), que sí cambia
+    si el monto se reescribió con otro trazo. También es atípico el dígito cuya
+    altura o línea base se aleja de las de los demás dígitos de su palabra más
+    que las tolerancias de FRAUDE, y el que respecto a la altura de su línea es
+    más alto o más bajo que los dígitos de todo el documento ("tamano"), lo que
+    delata un monto reescrito entero en otro tamaño.
+
+    Parámetros:
+    glifos_por_pagina (list): Pares (número de página, resultado de extraer_glifos).
+
+    Retorna:
+    dict: "digitos" (total de dígitos comparados), "palabras_descartadas"
+        (palabras numéricas sin revisar porque sus componentes no coinciden con
+        su texto) y "atipicos", lista de {"pagina", "caja", "digito", "palabra",
+        "motivos"}.
+    """
+    descartadas = sum(g["palabras_descartadas"] for _, g in glifos_por_pagina)
+    paginas = [p for p, g in glifos_por_pagina for _ in range(len(g["digitos"]))]
+    if not paginas:
+        return {"digitos": 0, "palabras_descartadas": descartadas, "atipicos": []}
+    glifos = {
+        clave: np.concatenate([g[clave] for _, g in glifos_por_pagina])
+        for clave in glifos_por_pagina[0][1] if clave != "palabras_descartadas"
+    }
+    total = len(paginas)
+    motivos = [[] for _ in range(total)]
+
+    for digito in np.unique(glifos["digitos"]):
+        grupo = np.flatnonzero(glifos["digitos"] == digito)
+        if len(grupo) < FRAUDE["glifos_min_por_digito"]:
+            continue
+        distancias = _distancias_huellas(glifos["huellas"][grupo])
+        np.fill_diagonal(distancias, np.inf)
+        vecino = distancias.min(axis=1)
+        mediana = np.median(vecino)
+        desvio = max(1.4826 * float(np.median(np.abs(vecino - mediana))), FRAUDE["glifos_desvio_forma"])
+        for i in grupo[vecino - mediana > 3 * desvio]:
+            motivos[i].append("forma")
+        huellas = glifos["huellas"][grupo]
+        tinta = huellas.sum(axis=1) / np.maximum(huellas.max(axis=1), 1e-6)
+        for i in grupo[np.abs(tinta / np.median(tinta) - 1) > FRAUDE["glifos_tolerancia_grosor"]]:
+            motivos[i].append("grosor")
+        # El grosor absoluto del trazo (respecto a la altura de la línea) sí ve un
+        # monto reescrito con otro trazo; se compara dentro del grupo porque la
+        # medida depende de la forma del dígito
+        trazo = glifos["trazo_linea"][grupo]
+        for i in grupo[np.abs(trazo / np.median(trazo) - 1) > FRAUDE["glifos_tolerancia_trazo"]]:
+            motivos[i].append("trazo")
+
+    with np.errstate(invalid="ignore"):
+        altura = np.abs(glifos["altura_relativa"]) > FRAUDE["glifos_tolerancia_altura"]
+        base = np.abs(glifos["base_relativa"]) > FRAUDE["glifos_tolerancia_base"]
+    for i in np.flatnonzero(altura):
+        motivos[i].append("altura")
+    for i in np.flatnonzero(base):
+        motivos[i].append("linea_base")
+
+    # Altura respecto a la de la línea, contra todos los dígitos del documento
+    altura = glifos["altura_linea"]
+    for i in np.flatnonzero(np.abs(altura / np.median(altura) - 1) > FRAUDE["glifos_tolerancia_altura_linea"]):
+        motivos[i].append("tamano")
+
+    atipicos = [
+        {
+            "pagina": paginas[i],
+            "caja": [int(v) for v in glifos["cajas"][i]],
+            "digito": str(glifos["digitos"][i]),
+            "palabra": glifos["palabras"][i],
+            "motivos": motivos[i]
+        }
+        for i in range(total) if motivos[i]
+    ]
+    return {"digitos": total, "palabras_descartadas": descartadas, "atipicos": atipicos}
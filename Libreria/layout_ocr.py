@@ -0,0 +1,158 @@
+import re
+
+import numpy as np
+
+
+class LayoutOCR:
+    """
+    Resultado de OCR de una página a nivel de palabra, guardado en arreglos.
+
+    - palabras: texto de cada palabra.
+    - cajas: arreglo (N, 4) int32 con x, y, ancho, alto de cada palabra.
+    - confianzas: arreglo (N,) float32 con la confianza de Tesseract (0-100).
+    - lineas / bloques: arreglos (N,) int32 con el número de línea y de bloque
+      de cada palabra (numerados desde 0 en orden de lectura).
+
+    Un mismo objeto alimenta el texto plano, los extractores, el análisis
+    visual y el reporte, así ninguna etapa necesita una segunda pasada de OCR.
+    """
+
+    def __init__(self, palabras, cajas, confianzas, lineas, bloques, ancho, alto):
+        self.palabras = list(palabras)
+        self.cajas = np.asarray(cajas, dtype=np.int32).reshape(-1, 4)
+        self.confianzas = np.asarray(confianzas, dtype=np.float32)
+        self.lineas = np.asarray(lineas, dtype=np.int32)
+        self.bloques = np.asarray(bloques, dtype=np.int32)
+        self.ancho = int(ancho)
+        self.alto = int(alto)
+
+    def __len__(self):
+        return len(self.palabras)
+
+    @classmethod
+    def desde_tesseract(cls, datos, ancho, alto):
+        """
+        Construye el layout a partir de la salida de pytesseract.image_to_data
+        (Output.DICT). Se descartan los niveles que no son palabra y las palabras vacías.
+        """
+        nivel = np.asarray(datos["level"], dtype=np.int32)
+        textos = np.asarray([str(t).strip() for t in datos["text"]], dtype=object)
+        conf = np.asarray(datos["conf"], dtype=np.float32)
+        validas = (nivel == 5) & (textos != "") & (conf >= 0)
+
+        bloque = np.asarray(datos["block_num"], dtype=np.int64)[validas]
+        parrafo = np.asarray(datos["par_num"], dtype=np.int64)[validas]
+        linea = np.asarray(datos["line_num"], dtype=np.int64)[validas]
+        _, bloques = np.unique(bloque, return_inverse=True)
+        _, lineas = np.unique((bloque * 1000 + parrafo) * 1000 + linea, return_inverse=True)
+
+        cajas = np.stack([
+            np.asarray(datos[campo], dtype=np.int32)[validas]
+            for campo in ("left", "top", "width", "height")
+        ], axis=1) if validas.any() else np.zeros((0, 4), dtype=np.int32)
+
+        return cls(textos[validas].tolist(), cajas, conf[validas], lineas, bloques, ancho, alto)
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """
+        Reconstruye el layout desde su forma serializable (ver a_dict).
+        """
+        return cls(
+            datos["palabras"], datos["cajas"], datos["confianzas"],
+            datos["lineas"], datos["bloques"], datos["ancho"], datos["alto"]
+        )
+
+    def a_dict(self):
+        """
+        Forma serializable a JSON, usada para guardar el layout en la caché de OCR.
+        """
+        return {
+            "palabras": self.palabras,
+            "cajas": self.cajas.tolist(),
+            "confianzas": [round(float(c), 2) for c in self.confianzas],
+            "lineas": self.lineas.tolist(),
+            "bloques": self.bloques.tolist(),
+            "ancho": self.ancho,
+            "alto": self.alto
+        }
+
+    def transformar(self, matriz, ancho, alto):
+        """
+        Lleva las cajas a otro sistema de coordenadas con una matriz afín 2x3
+        (por ejemplo, de la imagen preprocesada para OCR a la página original).
+        Cada caja se reemplaza por la envolvente de sus cuatro esquinas transformadas.
+        """
+        matriz = np.asarray(matriz, dtype=np.float64)
+        if len(self):
+            x, y, w, h = (self.cajas[:, i].astype(np.float64) for i in range(4))
+            esquinas = np.stack([
+                np.stack([x, y], axis=1), np.stack([x + w, y], axis=1),
+                np.stack([x, y + h], axis=1), np.stack([x + w, y + h], axis=1)
+            ], axis=1)
+            destino = esquinas @ matriz[:, :2].T + matriz[:, 2]
+            minimo = np.floor(destino.min(axis=1))
+            maximo = np.ceil(destino.max(axis=1))
+            self.cajas = np.concatenate([minimo, maximo - minimo], axis=1).astype(np.int32)
+        self.ancho = int(ancho)
+        self.alto = int(alto)
+        return self
+
+    def texto(self):
+        """
+        Reconstruye el texto plano: palabras separadas por espacio, una línea por
+        renglón y una línea en blanco entre bloques.
+        """
+        if not self.palabras:
+            return ""
+        partes = []
+        for i, palabra in enumerate(self.palabras):
+            if i > 0:
+                if self.bloques[i] != self.bloques[i - 1]:
+                    partes.append("\n\n")
+                elif self.lineas[i] != self.lineas[i - 1]:
+                    partes.append("\n")
+                else:
+                    partes.append(" ")
+            partes.append(palabra)
+        partes.append("\n")
+        return "".join(partes)
+
+    def confianza_media(self):
+        """
+        Confianza media de las palabras reconocidas, o None si no hay palabras.
+        """
+        return float(self.confianzas.mean()) if len(self.confianzas) else None
+
+    def indices_en_region(self, x0, y0, x1, y1):
+        """
+        Índices de las palabras cuyo centro cae dentro de la región indicada.
+        """
+        centros_x = self.cajas[:, 0] + self.cajas[:, 2] / 2
+        centros_y = self.cajas[:, 1] + self.cajas[:, 3] / 2
+        mascara = (centros_x >= x0) & (centros_x < x1) & (centros_y >= y0) & (centros_y < y1)
+        return np.flatnonzero(mascara)
+
+    def buscar(self, patron):
+        """
+        Índices de las palabras que coinciden con la expresión regular indicada.
+        """
+        regex = re.compile(patron, re.IGNORECASE)
+        return np.asarray([i for i, p in enumerate(self.palabras) if regex.search(p)], dtype=np.int64)
+
+    def cajas_lineas(self):
+        """
+        Caja envolvente (x, y, ancho, alto) de cada línea, en orden de línea.
+        """
+        if not len(self):
+            return np.zeros((0, 4), dtype=np.int32)
+        n = int(self.lineas.max()) + 1
+        x0 = np.full(n, np.iinfo(np.int32).max, dtype=np.int64)
+        y0 = np.full(n, np.iinfo(np.int32).max, dtype=np.int64)
+        x1 = np.zeros(n, dtype=np.int64)
+        y1 = np.zeros(n, dtype=np.int64)
+        np.minimum.at(x0, self.lineas, self.cajas[:, 0])
+        np.minimum.at(y0, self.lineas, self.cajas[:, 1])
+        np.maximum.at(x1, self.lineas, self.cajas[:, 0] + self.cajas[:, 2])
+        np.maximum.at(y1, self.lineas, self.cajas[:, 1] + self.cajas[:, 3])
+        return np.stack([x0, y0, x1 - x0, y1 - y0], axis=1).astype(np.int32)
@@ -0,0 +1,259 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from libreria.config import OCR
+from libreria.layout_ocr import LayoutOCR
+
+try:
+    import tesserocr
+except ImportError:  # Dependencia opcional, solo para el motor "tesserocr"
+    tesserocr = None
+
+
+MOTORES = ("pytesseract", "tesserocr")
+
+# Franja blanca entre las regiones apiladas en el mosaico de pytesseract
+SEPARACION_MOSAICO = 20
+
+# Campos de pytesseract.image_to_data que usa LayoutOCR
+CAMPOS_DATOS = (
+    "level", "text", "conf", "block_num", "par_num", "line_num",
+    "left", "top", "width", "height"
+)
+
+_local = threading.local()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def motor_configurado():
+    """
+    Retorna el motor de OCR de OCR["motor"]; con "auto", "tesserocr" si el
+    paquete está instalado (ver requirements-opcional.txt) y si no "pytesseract".
+    """
+    if OCR["motor"] == "auto":
+        return "tesserocr" if tesserocr is not None else "pytesseract"
+    return OCR["motor"]
+
+
+def _api_tesserocr():
+    """
+    Retorna la instancia de Tesseract de este hilo, creándola la primera vez.
+    Los datos del idioma se cargan una sola vez por hilo/proceso.
+    """
+    api = getattr(_local, "api", None)
+    if api is None:
+        if tesserocr is None:
+            raise ImportError("El motor OCR 'tesserocr' requiere instalar el paquete tesserocr")
+        api = tesserocr.PyTessBaseAPI(lang=OCR["lang"])
+        _local.api = api
+    return api
+
+
+def _datos_tesserocr(api):
+    """
+    Recorre el resultado de tesserocr palabra por palabra y lo deja en el mismo
+    formato que pytesseract.image_to_data.
+    """
+    datos = {campo: [] for campo in CAMPOS_DATOS}
+    bloque = linea = 0
+    for palabra in tesserocr.iterate_level(api.GetIterator(), tesserocr.RIL.WORD):
+        if palabra.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+            bloque += 1
+        if palabra.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+            linea += 1
+        caja = palabra.BoundingBox(tesserocr.RIL.WORD)
+        if caja is None:
+            continue
+        x0, y0, x1, y1 = caja
+        datos["level"].append(5)
+        datos["text"].append(palabra.GetUTF8Text(tesserocr.RIL.WORD) or "")
+        datos["conf"].append(palabra.Confidence(tesserocr.RIL.WORD))
+        datos["block_num"].append(bloque)
+        datos["par_num"].append(0)
+        datos["line_num"].append(linea)
+        datos["left"].append(x0)
+        datos["top"].append(y0)
+        datos["width"].append(x1 - x0)
+        datos["height"].append(y1 - y0)
+    return datos
+
+
+def ocr_layout(imagen, motor=None):
+    """
+    Aplica OCR a una imagen y retorna el LayoutOCR de la página (palabras,
+    cajas, confianzas, líneas y bloques). El texto plano se obtiene con
+    LayoutOCR.texto(), sin una segunda pasada de OCR.
+    """
+    motor = motor or motor_configurado()
+    if motor not in MOTORES:
+        raise ValueError(f"Motor OCR no soportado: {motor}")
+    if isinstance(imagen, np.ndarray):
+        imagen = Image.fromarray(imagen)
+    ancho, alto = imagen.size
+    if motor == "tesserocr":
+        api = _api_tesserocr()
+        api.SetImage(imagen)
+        api.Recognize()
+        datos = _datos_tesserocr(api)
+    else:
+        datos = pytesseract.image_to_data(
+            imagen, lang=OCR["lang"], output_type=pytesseract.Output.DICT
+        )
+    return LayoutOCR.desde_tesseract(datos, ancho, alto)
+
+
+def ocr_regiones(imagen, cajas, perfil, motor=None):
+    """
+    Aplica OCR a varias regiones de la misma página con un perfil de Tesseract
+    (modo de segmentación y lista blanca de caracteres).
+
+    Con "tesserocr" la página se carga una sola vez y cada región se reconoce
+    con SetRectangle. Con "pytesseract" las regiones se recortan y se apilan en
+    un mosaico que se reconoce en un solo proceso de tesseract (con el modo de
+    segmentación "psm_mosaico" del perfil, un bloque de varias líneas); cada
+    palabra se devuelve a su región por su posición.
+
+    Retorna:
+    list: Por cada caja, un diccionario en el formato de image_to_data con las
+        coordenadas ya referidas a la página completa.
+    """
+    motor = motor or motor_configurado()
+    if motor not in MOTORES:
+        raise ValueError(f"Motor OCR no soportado: {motor}")
+    imagen = np.asarray(imagen)
+    alto, ancho = imagen.shape[:2]
+    margen = OCR["regiones_margen"]
+    resultados = []
+
+    if motor == "tesserocr":
+        api = _api_tesserocr()
+        api.SetImage(Image.fromarray(imagen))
+        api.SetPageSegMode(perfil["psm"])
+        api.SetVariable("tessedit_char_whitelist", perfil["lista_blanca"] or "")
+        try:
+            for x, y, w, h in cajas:
+                x0, y0 = max(0, x - margen), max(0, y - margen)
+                x1, y1 = min(ancho, x + w + margen), min(alto, y + h + margen)
+                api.SetRectangle(int(x0), int(y0), int(x1 - x0), int(y1 - y0))
+                api.Recognize()
+                resultados.append(_datos_tesserocr(api))
+        finally:
+            api.SetVariable("tessedit_char_whitelist", "")
+            api.SetPageSegMode(tesserocr.PSM.AUTO)
+        return resultados
+
+    # Con pytesseract cada llamada es un proceso de tesseract que vuelve a cargar
+    # el modelo de idioma: las regiones se apilan en una sola imagen (ver
+    # _mosaico_regiones) y se reconocen en una sola llamada
+    recortes = []
+    for x, y, w, h in cajas:
+        x0, y0 = max(0, x - margen), max(0, y - margen)
+        x1, y1 = min(ancho, x + w + margen), min(alto, y + h + margen)
+        recortes.append((int(x0), int(y0), imagen[y0:y1, x0:x1]))
+    if not recortes:
+        return []
+    mosaico, inicios = _mosaico_regiones([recorte for _, _, recorte in recortes])
+    config = f"--psm {perfil['psm_mosaico']}"
+    if perfil["lista_blanca"]:
+        config += f" -c tessedit_char_whitelist={perfil['lista_blanca']}"
+    datos = pytesseract.image_to_data(
+        Image.fromarray(mosaico), lang=OCR["lang"], config=config, output_type=pytesseract.Output.DICT
+    )
+
+    # Cada palabra vuelve a la región en cuya franja cae su centro vertical
+    resultados = [{campo: [] for campo in CAMPOS_DATOS} for _ in recortes]
+    limites = np.asarray(inicios[1:]) - SEPARACION_MOSAICO / 2
+    for i in range(len(datos["text"])):
+        if int(datos["level"][i]) != 5:
+            continue
+        centro = int(datos["top"][i]) + int(datos["height"][i]) / 2
+        region = int(np.searchsorted(limites, centro))
+        x0, y0, _ = recortes[region]
+        for campo in CAMPOS_DATOS:
+            valor = datos[campo][i]
+            if campo == "left":
+                valor = int(valor) - SEPARACION_MOSAICO + x0
+            elif campo == "top":
+                valor = int(valor) - inicios[region] + y0
+            resultados[region][campo].append(valor)
+    return resultados
+
+
+def _mosaico_regiones(recortes):
+    """
+    Apila los recortes de las regiones uno debajo del otro, alineados a la
+    izquierda y separados por franjas blancas de SEPARACION_MOSAICO píxeles,
+    para reconocerlos con una sola llamada a Tesseract.
+
+    Retorna:
+    tuple: (mosaico, fila en que empieza cada recorte).
+    """
+    alto = sum(r.shape[0] for r in recortes) + SEPARACION_MOSAICO * (len(recortes) + 1)
+    ancho = max(r.shape[1] for r in recortes) + 2 * SEPARACION_MOSAICO
+    mosaico = np.full((alto, ancho) + recortes[0].shape[2:], 255, dtype=recortes[0].dtype)
+    inicios = []
+    y = SEPARACION_MOSAICO
+    for recorte in recortes:
+        h, w = recorte.shape[:2]
+        mosaico[y:y + h, SEPARACION_MOSAICO:SEPARACION_MOSAICO + w] = recorte
+        inicios.append(y)
+        y += h + SEPARACION_MOSAICO
+    return mosaico, inicios
+
+
+def _iniciar_proceso(motor):
+    """
+    Inicializador de los procesos del pool: deja cargado el motor antes de
+    recibir la primera página. Cada proceso ya ocupa un núcleo, así que OpenCV
+    trabaja con un solo hilo dentro de él.
+    """
+    cv2.setNumThreads(1)
+    if motor == "tesserocr":
+        _api_tesserocr()
+
+
+def obtener_pool():
+    """
+    Retorna el pool de procesos de OCR del proceso actual, creándolo la primera vez.
+
+    El pool vive mientras viva la aplicación y lo comparten todas las sesiones,
+    así los procesos (y el modelo de idioma, con "tesserocr") se crean una sola vez.
+    Se crea cuando la aplicación ya tiene hilos (Streamlit, los pools del
+    análisis visual y del AnalizadorFraude), por eso los procesos no se crean con
+    fork, que copia el estado de los locks de esos hilos y puede dejar bloqueado
+    a un proceso: se usa forkserver, o spawn donde no existe (Windows).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR["procesos"] or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context(metodo),
+                initializer=_iniciar_proceso,
+                initargs=(motor_configurado(),)
+            )
+        return _pool
+
+
+def cerrar_pool():
+    """
+    Cierra el pool de OCR. El siguiente uso crea uno nuevo.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(cerrar_pool)
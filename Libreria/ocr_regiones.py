@@ -0,0 +1,132 @@
+import re
+
+import cv2
+import numpy as np
+
+from libreria.config import OCR
+from libreria.layout_ocr import LayoutOCR
+from libreria import motores_ocr
+
+# Perfiles de Tesseract por tipo de región. Los campos numéricos dudosos (montos,
+# fechas, cédulas) se vuelven a reconocer con una lista blanca de dígitos y signos de
+# moneda. "psm" es el modo de cada región sola (tesserocr) y "psm_mosaico" el
+# de todas las regiones apiladas en una imagen (pytesseract)
+PERFILES_REGION = {
+    "texto": {"psm": 7, "psm_mosaico": 6, "lista_blanca": None},
+    "numerico": {"psm": 7, "psm_mosaico": 6, "lista_blanca": "0123456789$.,-/"}
+}
+
+_CARACTERES_NUMERICOS = re.compile(r"[\d$.,\-/]")
+
+
+def detectar_regiones_texto(imagen):
+    """
+    Encuentra regiones de texto de forma barata, sin OCR: binariza la página,
+    une los caracteres de una misma frase con una dilatación horizontal y toma
+    los componentes conectados resultantes.
+
+    Parámetros:
+    imagen (numpy.ndarray): Página en RGB o escala de grises.
+
+    Retorna:
+    tuple: Cajas (N, 4) int32 con x, y, ancho, alto en orden de lectura y el
+        número de renglón de cada una.
+    """
+    gris = imagen if imagen.ndim == 2 else cv2.cvtColor(imagen, cv2.COLOR_RGB2GRAY)
+    alto, ancho = gris.shape
+    _, binaria = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(3, ancho // 80), max(1, alto // 400))
+    )
+    unida = cv2.dilate(binaria, kernel)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(unida, connectivity=8)
+    cajas = stats[1:, :4]
+
+    min_alto = OCR["regiones_min_alto"]
+    max_alto = alto * OCR["regiones_max_alto_relativo"]
+    validas = (cajas[:, 3] >= min_alto) & (cajas[:, 3] <= max_alto) & (cajas[:, 2] >= min_alto)
+    cajas = cajas[validas].astype(np.int32)
+    renglones = agrupar_renglones(cajas)
+    orden = np.lexsort((cajas[:, 0], renglones))
+    return cajas[orden], renglones[orden]
+
+
+def agrupar_renglones(cajas):
+    """
+    Asigna a cada caja el número de renglón de la página: las cajas cuyos centros
+    verticales están a menos de media altura típica quedan en el mismo renglón.
+    """
+    if not len(cajas):
+        return np.zeros(0, dtype=np.int32)
+    centros = cajas[:, 1] + cajas[:, 3] / 2
+    orden = np.argsort(centros, kind="stable")
+    tolerancia = max(1.0, float(np.median(cajas[:, 3])) / 2)
+    saltos = np.diff(centros[orden]) > tolerancia
+    renglones = np.empty(len(cajas), dtype=np.int32)
+    renglones[orden] = np.concatenate([[0], np.cumsum(saltos)])
+    return renglones
+
+
+def es_region_campo(textos):
+    """
+    Indica si una región es un campo: pocas palabras (OCR["regiones_max_palabras_campo"])
+    cuyo texto es principalmente numérico (montos, fechas, números de documento).
+    Los párrafos con alguna cifra no cuentan como campo.
+    """
+    textos = [t for t in textos if str(t).strip()]
+    if len(textos) > OCR["regiones_max_palabras_campo"]:
+        return False
+    caracteres = "".join("".join(textos).split())
+    if not caracteres or not any(c.isdigit() for c in caracteres):
+        return False
+    numericos = len(_CARACTERES_NUMERICOS.findall(caracteres))
+    return numericos / len(caracteres) >= OCR["regiones_proporcion_numerica"]
+
+
+def _confianza(datos):
+    confianzas = [float(c) for c in datos["conf"] if float(c) >= 0]
+    return sum(confianzas) / len(confianzas) if confianzas else -1
+
+
+def ocr_layout_por_regiones(imagen, motor=None):
+    """
+    Aplica OCR solo a las regiones de texto de la página y retorna su LayoutOCR.
+
+    Cada región se reconoce como una sola línea de texto (con pytesseract todas
+    las regiones van en un mismo mosaico, ver motores_ocr.ocr_regiones). Solo los
+    campos (montos, fechas, cédulas; ver es_region_campo) que se leyeron con
+    confianza menor a OCR["regiones_confianza_relectura"] se vuelven a reconocer
+    con el perfil "numerico", y se conserva el resultado de mayor confianza: con
+    pytesseract es un proceso de tesseract por página, y un segundo solo para
+    los campos dudosos.
+    """
+    imagen = np.asarray(imagen)
+    cajas, renglones = detectar_regiones_texto(imagen)
+    datos_regiones = motores_ocr.ocr_regiones(imagen, cajas, PERFILES_REGION["texto"], motor)
+
+    dudosos = [
+        i for i, datos in enumerate(datos_regiones)
+        if es_region_campo(datos["text"]) and _confianza(datos) < OCR["regiones_confianza_relectura"]
+    ]
+    if dudosos:
+        datos_numericos = motores_ocr.ocr_regiones(
+            imagen, cajas[dudosos], PERFILES_REGION["numerico"], motor
+        )
+        for i, datos in zip(dudosos, datos_numericos):
+            if _confianza(datos) >= _confianza(datos_regiones[i]):
+                datos_regiones[i] = datos
+
+    # Las regiones de un mismo renglón forman una línea del layout, así el
+    # texto reconstruido conserva las filas de las tablas de los extractos
+    combinados = {campo: [] for campo in motores_ocr.CAMPOS_DATOS}
+    for datos, renglon in zip(datos_regiones, renglones):
+        n = len(datos["text"])
+        for campo in motores_ocr.CAMPOS_DATOS:
+            if campo in ("block_num", "par_num"):
+                combinados[campo].extend([1] * n)
+            elif campo == "line_num":
+                combinados[campo].extend([int(renglon)] * n)
+            else:
+                combinados[campo].extend(datos[campo])
+    alto, ancho = imagen.shape[:2]
+    return LayoutOCR.desde_tesseract(combinados, ancho, alto)
@@ -0,0 +1,161 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import pdf2image
+
+from libreria.config import OCR
+from libreria.caracteristicas_pagina import CaracteristicasPagina
+
+
+def contar_paginas_pdf(file_path):
+    """
+    Retorna el número de páginas del PDF según poppler.
+    """
+    info = pdf2image.pdfinfo_from_path(file_path, poppler_path=OCR["poppler_path"])
+    return int(info["Pages"])
+
+
+def renderizar_pagina_pdf(file_path, numero_pagina, dpi=200, escala_grises=False):
+    """
+    Rasteriza una sola página del PDF (numeradas desde 1) como imagen PIL.
+    """
+    imagenes = pdf2image.convert_from_path(
+        file_path,
+        dpi=dpi,
+        grayscale=escala_grises,
+        poppler_path=OCR["poppler_path"],
+        first_page=numero_pagina,
+        last_page=numero_pagina
+    )
+    return imagenes[0]
+
+
+class PaginasDocumento:
+    """
+    Páginas de un documento rasterizadas una sola vez y compartidas como
+    arreglos NumPy (BGR, como los entrega cv2.imread, o en escala de grises
+    con escala_grises=True).
+
+    La misma instancia se pasa al OCR, al análisis visual y al AnalizadorFraude
+    para que ninguna etapa vuelva a invocar poppler ni a leer la imagen del disco.
+    Las páginas se rasterizan solo cuando se piden y se conservan como máximo
+    `max_en_memoria` a la vez (las usadas hace más tiempo se liberan primero),
+    así la memoria no crece con el número de páginas del extracto.
+    """
+
+    def __init__(self, file_path, dpi=200, max_en_memoria=None, escala_grises=False):
+        self.file_path = file_path
+        self.dpi = dpi
+        self.escala_grises = escala_grises
+        self.es_pdf = file_path.lower().endswith(".pdf")
+        if max_en_memoria is None:
+            max_en_memoria = OCR["max_paginas_en_memoria"]
+        self.max_en_memoria = max_en_memoria
+        self._paginas = OrderedDict()
+        self._caracteristicas = OrderedDict()
+        self._numero_paginas = None
+        self._geometrias = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        if self._numero_paginas is None:
+            self._numero_paginas = contar_paginas_pdf(self.file_path) if self.es_pdf else 1
+        return self._numero_paginas
+
+    def __iter__(self):
+        return self.iterar()
+
+    def iterar(self, desde=0, hasta=None):
+        """
+        Generador que rasteriza y entrega las páginas de una en una, desde la
+        página `desde` hasta antes de `hasta` (numeradas desde 0). Las páginas
+        siguientes no se rasterizan si quien consume deja de iterar.
+        """
+        if hasta is None or hasta > len(self):
+            hasta = len(self)
+        for indice in range(desde, hasta):
+            yield self.pagina(indice)
+
+    def pagina(self, indice):
+        """
+        Retorna la página indicada (numeradas desde 0), rasterizándola si no está
+        en memoria. Retorna None si la imagen no se pudo cargar.
+        """
+        with self._lock:
+            if indice in self._paginas:
+                self._paginas.move_to_end(indice)
+                return self._paginas[indice]
+        # Se rasteriza fuera del lock para que varios hilos carguen páginas distintas a la vez
+        imagen = self._cargar(indice)
+        with self._lock:
+            imagen = self._paginas.setdefault(indice, imagen)
+            self._paginas.move_to_end(indice)
+            if self.max_en_memoria:
+                while len(self._paginas) > self.max_en_memoria:
+                    self._paginas.popitem(last=False)
+            return imagen
+
+    def pagina_rgb(self, indice):
+        """
+        Retorna la página en orden RGB, como la esperan PIL y pytesseract
+        (o en escala de grises si el documento se rasterizó así).
+        """
+        imagen = self.pagina(indice)
+        if imagen is None or imagen.ndim == 2:
+            return imagen
+        return cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
+
+    def caracteristicas(self, indice):
+        """
+        Retorna las CaracteristicasPagina de la página indicada, compartidas por el
+        análisis visual y el AnalizadorFraude. Se conservan con el mismo límite
+        que las páginas. Retorna None si la página no se pudo cargar.
+        """
+        imagen = self.pagina(indice)
+        if imagen is None:
+            return None
+        with self._lock:
+            caracteristicas = self._caracteristicas.get(indice)
+            if caracteristicas is None or caracteristicas.imagen is not imagen:
+                caracteristicas = CaracteristicasPagina(imagen)
+                self._caracteristicas[indice] = caracteristicas
+            self._caracteristicas.move_to_end(indice)
+            if self.max_en_memoria:
+                while len(self._caracteristicas) > self.max_en_memoria:
+                    self._caracteristicas.popitem(last=False)
+            return caracteristicas
+
+    def geometria(self, indice, clave, calcular):
+        """
+        Retorna la orientación/inclinación de la página guardada bajo `clave`,
+        calculándola con calcular() solo la primera vez. A diferencia de las
+        imágenes, este resultado es pequeño y no se libera.
+        """
+        with self._lock:
+            if (indice, clave) in self._geometrias:
+                return self._geometrias[(indice, clave)]
+        geometria = calcular()
+        with self._lock:
+            self._geometrias[(indice, clave)] = geometria
+        return geometria
+
+    def _cargar(self, indice):
+        if not self.es_pdf:
+            modo = cv2.IMREAD_GRAYSCALE if self.escala_grises else cv2.IMREAD_COLOR
+            return cv2.imread(self.file_path, modo)
+        imagen = renderizar_pagina_pdf(
+            self.file_path, indice + 1, dpi=self.dpi, escala_grises=self.escala_grises
+        )
+        if self.escala_grises:
+            return np.asarray(imagen.convert("L"))
+        return cv2.cvtColor(np.asarray(imagen.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+    def liberar(self):
+        """
+        Descarta las páginas rasterizadas.
+        """
+        with self._lock:
+            self._paginas.clear()
+            self._caracteristicas.clear()
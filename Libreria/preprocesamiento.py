@@ -0,0 +1,167 @@
+import math
+
+import cv2
+import numpy as np
+import pytesseract
+
+from libreria.config import OCR, PERFILES_OCR
+
+# Ancho de una hoja carta en puntos; los DPI de los perfiles están pensados para ese tamaño
+ANCHO_CARTA_PT = 612
+
+
+def obtener_perfil(nombre=None):
+    """
+    Retorna el perfil de preprocesamiento indicado o el configurado en OCR["perfil"].
+    """
+    nombre = nombre or OCR["perfil"]
+    if nombre not in PERFILES_OCR:
+        raise ValueError(f"Perfil de OCR no soportado: {nombre}")
+    return PERFILES_OCR[nombre]
+
+
+def dpi_para_pagina(ancho_pt, perfil):
+    """
+    DPI de render para una página de `ancho_pt` puntos. Las páginas más grandes
+    que una carta se renderizan con menos DPI para que el texto quede del mismo
+    tamaño en píxeles, dentro de los límites del perfil.
+    """
+    dpi = perfil["dpi"] * ANCHO_CARTA_PT / max(1.0, float(ancho_pt))
+    return int(min(perfil["dpi_max"], max(perfil["dpi_min"], dpi)))
+
+
+def altura_caracter(gris):
+    """
+    Estima la altura típica de los caracteres (mediana de la altura de los
+    componentes conectados con forma de letra), o None si no hay texto.
+    """
+    _, binaria = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binaria, connectivity=8)
+    alturas = stats[1:, cv2.CC_STAT_HEIGHT]
+    anchos = stats[1:, cv2.CC_STAT_WIDTH]
+    letras = (alturas >= 5) & (alturas <= gris.shape[0] // 10) & (anchos <= alturas * 3)
+    return float(np.median(alturas[letras])) if letras.any() else None
+
+
+def escala_para_imagen(gris, perfil):
+    """
+    Factor de escala para fotos y escaneos sin DPI conocido: lleva la altura
+    de los caracteres a perfil["altura_caracter"] píxeles.
+    """
+    altura = altura_caracter(gris)
+    if not altura:
+        return 1.0
+    return float(np.clip(perfil["altura_caracter"] / altura, 0.5, 3.0))
+
+
+def orientacion(gris):
+    """
+    Rotación en grados (0, 90, 180 o 270, sentido horario) que deja la página
+    derecha, según la detección de orientación de Tesseract. Retorna 0 si no
+    se puede detectar.
+    """
+    try:
+        osd = pytesseract.image_to_osd(gris, output_type=pytesseract.Output.DICT)
+        return int(osd.get("rotate", 0)) % 360
+    except Exception:
+        return 0
+
+
+def inclinacion(gris, max_grados):
+    """
+    Ángulo de inclinación del texto en grados (positivo si los renglones bajan
+    hacia la derecha). Se calcula con los momentos de los renglones, obtenidos
+    en una sola pasada de componentes conectados sobre la página reducida.
+    """
+    factor = min(1.0, 1000.0 / max(gris.shape))
+    reducida = cv2.resize(gris, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA) if factor < 1 else gris
+    _, binaria = cv2.threshold(reducida, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    renglones = cv2.dilate(binaria, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 1)))
+    n, etiquetas, stats, _ = cv2.connectedComponentsWithStats(renglones, connectivity=8)
+    if n <= 1:
+        return 0.0
+
+    # Momentos de segundo orden de todos los componentes a la vez
+    ys, xs = np.nonzero(etiquetas)
+    ids = etiquetas[ys, xs]
+    xs = xs.astype(np.float64)
+    ys = ys.astype(np.float64)
+    area = np.bincount(ids, minlength=n)[1:].astype(np.float64)
+    sx = np.bincount(ids, xs, minlength=n)[1:]
+    sy = np.bincount(ids, ys, minlength=n)[1:]
+    sxx = np.bincount(ids, xs * xs, minlength=n)[1:]
+    syy = np.bincount(ids, ys * ys, minlength=n)[1:]
+    sxy = np.bincount(ids, xs * ys, minlength=n)[1:]
+    area = np.maximum(area, 1)
+    mu20 = sxx / area - (sx / area) ** 2
+    mu02 = syy / area - (sy / area) ** 2
+    mu11 = sxy / area - (sx / area) * (sy / area)
+    angulos = np.degrees(0.5 * np.arctan2(2 * mu11, mu20 - mu02))
+
+    # Solo los componentes alargados (renglones) votan, ponderados por su área
+    anchos = stats[1:, cv2.CC_STAT_WIDTH]
+    altos = stats[1:, cv2.CC_STAT_HEIGHT]
+    renglon = (anchos > 4 * altos) & (anchos > 40) & (np.abs(angulos) <= max_grados)
+    if not renglon.any():
+        return 0.0
+    orden = np.argsort(angulos[renglon])
+    pesos = np.cumsum(area[renglon][orden])
+    mediana = angulos[renglon][orden][np.searchsorted(pesos, pesos[-1] / 2)]
+    return float(mediana)
+
+
+def calcular_geometria(gris, perfil):
+    """
+    Orientación e inclinación de la página según el perfil. Es la parte costosa
+    del preprocesamiento, por eso PaginasDocumento la guarda por página.
+    """
+    return {
+        "rotacion": orientacion(gris) if perfil["corregir_orientacion"] else 0,
+        "inclinacion": inclinacion(gris, perfil["max_inclinacion"]) if perfil["enderezar"] else 0.0
+    }
+
+
+def preprocesar(imagen, perfil, escala=1.0, geometria=None):
+    """
+    Prepara una página para OCR según el perfil: escala de grises, escala,
+    rotación/enderezado y binarización, en una sola transformación afín.
+
+    Parámetros:
+    imagen (numpy.ndarray): Página en RGB o escala de grises.
+    perfil (dict): Perfil de PERFILES_OCR.
+    escala (float): Factor de escala a aplicar.
+    geometria (dict): Resultado de calcular_geometria, o None para no rotar.
+
+    Retorna:
+    tuple: (imagen preprocesada, matriz afín 2x3 que lleva coordenadas de la
+        imagen preprocesada a coordenadas de la imagen original).
+    """
+    gris = imagen if imagen.ndim == 2 else cv2.cvtColor(imagen, cv2.COLOR_RGB2GRAY)
+    alto, ancho = gris.shape
+    angulo = 0.0
+    if geometria:
+        # getRotationMatrix2D gira en sentido antihorario con ángulos positivos
+        angulo = -geometria["rotacion"] + geometria["inclinacion"]
+
+    if abs(angulo) < 0.05 and abs(escala - 1.0) < 1e-3:
+        matriz = np.float32([[1, 0, 0], [0, 1, 0]])
+        salida = gris
+    elif abs(angulo) < 0.05:
+        matriz = np.float32([[escala, 0, 0], [0, escala, 0]])
+        interpolacion = cv2.INTER_AREA if escala < 1 else cv2.INTER_CUBIC
+        salida = cv2.resize(gris, None, fx=escala, fy=escala, interpolation=interpolacion)
+    else:
+        matriz = cv2.getRotationMatrix2D((ancho / 2, alto / 2), angulo, escala)
+        cos, sen = abs(matriz[0, 0]), abs(matriz[0, 1])
+        nuevo_ancho = int(math.ceil(alto * sen + ancho * cos))
+        nuevo_alto = int(math.ceil(alto * cos + ancho * sen))
+        matriz[0, 2] += nuevo_ancho / 2 - ancho / 2
+        matriz[1, 2] += nuevo_alto / 2 - alto / 2
+        salida = cv2.warpAffine(
+            gris, matriz, (nuevo_ancho, nuevo_alto),
+            flags=cv2.INTER_LINEAR, borderValue=255
+        )
+
+    if perfil["binarizar"]:
+        _, salida = cv2.threshold(salida, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return salida, cv2.invertAffineTransform(matriz)
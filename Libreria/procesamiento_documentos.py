@@ -2,7 +2,6 @@ from typing import List, Dict, Any
 import streamlit as st
 from .modelos_ia import ModeloIA
 import PyPDF2
-from libreria.extraction_texto import extraccion_texto
 
 def procesar_documentos_subidos(uploaded_files: List[Any], modelo: Any) -> Dict[str, Any]:
     """
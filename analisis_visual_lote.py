@@ -0,0 +1,187 @@
+"""
+Análisis visual por lotes de documentos históricos.
+
+Analiza todos los documentos de un directorio (o de un manifiesto CSV) en varios
+procesos y escribe dos tablas, en Parquet o CSV:
+
+- <salida>_paginas: una fila por página con los resultados del análisis visual
+  y los tiempos de rasterización y de análisis.
+- <salida>_documentos: una fila por documento con el resultado combinado
+  (el mismo que muestra main.py) y el tiempo total.
+
+Sirve para calcular variables visuales de solicitudes antiguas, por ejemplo
+nitidez_docs_min: el pipeline de services.pipeline las une a las solicitudes
+desde VISUAL["variables_lote"] (ver unir_variables_visuales).
+
+Uso:
+    python analisis_visual_lote.py Datos/ --salida visual_historico
+    python analisis_visual_lote.py manifiesto.csv --procesos 8 --formato csv
+
+El manifiesto es un CSV con la columna "archivo" y, opcionalmente, "solicitud"
+y "tipo" (tipo de documento, ver TIPOS_DOCUMENTOS). Con un directorio, la
+solicitud es el nombre de la primera subcarpeta en la que está cada archivo.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import pandas as pd
+
+from libreria.config import VISUAL
+from libreria.paginas_documento import PaginasDocumento
+from services.visual import analizar_documento_visual
+
+EXTENSIONES = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff")
+
+
+def listar_documentos(entrada):
+    """
+    Retorna los documentos a analizar como diccionarios con "archivo",
+    "solicitud" y "tipo", a partir de un directorio o de un manifiesto CSV.
+    """
+    if os.path.isfile(entrada):
+        manifiesto = pd.read_csv(entrada, dtype=str)
+        if "archivo" not in manifiesto.columns:
+            raise ValueError("El manifiesto debe tener la columna 'archivo'")
+        for columna in ("solicitud", "tipo"):
+            if columna not in manifiesto.columns:
+                manifiesto[columna] = None
+        manifiesto = manifiesto.astype(object).where(manifiesto.notna(), None)
+        return manifiesto[["archivo", "solicitud", "tipo"]].to_dict("records")
+
+    documentos = []
+    for raiz, _, archivos in os.walk(entrada):
+        relativa = os.path.relpath(raiz, entrada)
+        solicitud = None if relativa == "." else relativa.split(os.sep)[0]
+        for nombre in sorted(archivos):
+            if nombre.lower().endswith(EXTENSIONES):
+                documentos.append({"archivo": os.path.join(raiz, nombre), "solicitud": solicitud, "tipo": None})
+    return sorted(documentos, key=lambda d: d["archivo"])
+
+
+def _iniciar_proceso():
+    # Cada proceso analiza un documento a la vez, página por página, y ya ocupa
+    # un núcleo: un solo hilo de análisis visual y uno de OpenCV
+    VISUAL["hilos"] = 1
+    VISUAL["hilos_opencv"] = 1
+    cv2.setNumThreads(1)
+
+
+def analizar_documento(documento):
+    """
+    Analiza un documento con analizar_documento_visual (el mismo resultado
+    combinado que muestra main.py) y guarda el resultado y los tiempos de cada
+    página a medida que terminan.
+
+    Retorna:
+    tuple: (filas por página, fila del documento).
+    """
+    inicio = time.perf_counter()
+    base = {"archivo": documento["archivo"], "solicitud": documento["solicitud"], "tipo": documento["tipo"]}
+    filas_paginas = []
+
+    def al_terminar_pagina(indice, resultado, segundos_render, segundos_analisis):
+        filas_paginas.append({
+            **base, "pagina": indice + 1, **fila_resultado(resultado),
+            "segundos_render": round(segundos_render, 4), "segundos_analisis": round(segundos_analisis, 4)
+        })
+
+    paginas = None
+    try:
+        paginas = PaginasDocumento(documento["archivo"], max_en_memoria=1)
+        resultado = analizar_documento_visual(
+            documento["archivo"], paginas, tipo=documento["tipo"], al_terminar_pagina=al_terminar_pagina
+        )
+    except Exception as e:
+        resultado = {"error": str(e)}
+    finally:
+        if paginas is not None:
+            paginas.liberar()
+    filas_paginas.sort(key=lambda fila: fila["pagina"])
+    fila_documento = {
+        **base, "paginas": len(filas_paginas), **fila_resultado(resultado),
+        "nitidez_min_pagina": min((f["nitidez"] for f in filas_paginas if f["nitidez"] is not None), default=None),
+        "segundos": round(time.perf_counter() - inicio, 4)
+    }
+    return filas_paginas, fila_documento
+
+
+def fila_resultado(resultado):
+    """
+    Aplana un resultado del análisis visual en columnas.
+    """
+    if "error" in resultado:
+        return {
+            "error": resultado["error"], "nivel": None, "numero_sellos": None, "numero_firmas": None,
+            "marcas_agua": None, "nitidez": None, "contraste": None, "confianza_ocr": None,
+            "codigos_sospecha": None
+        }
+    return {
+        "error": None,
+        "nivel": resultado.get("nivel"),
+        "numero_sellos": int(resultado["numero_sellos"]),
+        "numero_firmas": len(resultado["firmas_detectadas"]),
+        "marcas_agua": int(resultado["marcas_agua"]),
+        "nitidez": float(resultado["calidad"]["nitidez"]),
+        "contraste": float(resultado["calidad"]["contraste"]),
+        "confianza_ocr": resultado["calidad"].get("confianza_ocr"),
+        "codigos_sospecha": "|".join(resultado.get("codigos_sospecha", []))
+    }
+
+
+def analizar_lote(documentos, procesos=None):
+    """
+    Analiza los documentos en un pool de procesos (un documento por proceso a la vez).
+
+    Retorna:
+    tuple: DataFrames (paginas, documentos), ordenados por archivo y página.
+    """
+    filas_paginas = []
+    filas_documentos = []
+    with ProcessPoolExecutor(max_workers=procesos or os.cpu_count() or 1, initializer=_iniciar_proceso) as pool:
+        futuros = [pool.submit(analizar_documento, documento) for documento in documentos]
+        for terminados, futuro in enumerate(as_completed(futuros), start=1):
+            paginas, documento = futuro.result()
+            filas_paginas.extend(paginas)
+            filas_documentos.append(documento)
+            print(f"[{terminados}/{len(documentos)}] {documento['archivo']} ({documento['segundos']} s)", file=sys.stderr)
+    df_paginas = pd.DataFrame(filas_paginas)
+    df_documentos = pd.DataFrame(filas_documentos)
+    if len(df_paginas):
+        df_paginas = df_paginas.sort_values(["archivo", "pagina"], ignore_index=True)
+    if len(df_documentos):
+        df_documentos = df_documentos.sort_values("archivo", ignore_index=True)
+    return df_paginas, df_documentos
+
+
+def guardar(df, ruta, formato):
+    if formato == "parquet":
+        df.to_parquet(ruta, index=False)
+    else:
+        df.to_csv(ruta, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análisis visual por lotes")
+    parser.add_argument("entrada", help="Directorio de documentos o manifiesto CSV")
+    parser.add_argument("--salida", default="analisis_visual", help="Prefijo de los archivos de salida")
+    parser.add_argument("--formato", choices=("parquet", "csv"), default="parquet")
+    parser.add_argument("--procesos", type=int, help="Procesos en paralelo (por defecto el número de núcleos)")
+    args = parser.parse_args()
+
+    documentos = listar_documentos(args.entrada)
+    inicio = time.perf_counter()
+    df_paginas, df_documentos = analizar_lote(documentos, args.procesos)
+    guardar(df_paginas, f"{args.salida}_paginas.{args.formato}", args.formato)
+    guardar(df_documentos, f"{args.salida}_documentos.{args.formato}", args.formato)
+    print(
+        f"{len(df_documentos)} documentos, {len(df_paginas)} páginas en "
+        f"{time.perf_counter() - inicio:.1f} s", file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
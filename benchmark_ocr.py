@@ -0,0 +1,342 @@
+"""
+Benchmark de la extracción de texto (OCR) sobre los documentos de Datos/.
+
+Recorre los PDF e imágenes de Datos/ y Datos/pruebas/ (más variantes sintéticas:
+rotada, desenfocada, reducida y con compresión JPEG) con cada combinación de
+motor, perfil y modo de OCR, y escribe una línea JSON por documento y una de
+resumen por combinación con:
+
+- paginas_por_segundo
+- latencia_p50_ms / latencia_p95_ms por página
+- rss_pico_mb (proceso principal más los procesos del pool de OCR)
+- precision_caracteres contra el texto de referencia guardado en Datos/golden/
+
+Uso:
+    python benchmark_ocr.py --generar-golden
+    python benchmark_ocr.py --motores pytesseract tesserocr --perfiles rapido preciso \
+        --salida bench_ocr.jsonl
+
+Con --generar-golden se guarda el texto de referencia de cada documento: la capa
+de texto del PDF cuando existe y, si no, el OCR con el perfil "preciso". Los textos
+generados por OCR deben revisarse a mano antes de usarse como referencia.
+
+Se usa iterar_texto_paginas, la misma extracción que hay detrás de extraer_texto
+pero sin la caché de OCR, así cada corrida mide el OCR real.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from itertools import product
+
+import cv2
+import numpy as np
+import psutil
+
+from libreria.config import OCR
+from libreria import motores_ocr
+from libreria.extraction_texto import iterar_texto_paginas
+from libreria.paginas_documento import PaginasDocumento
+
+DIRECTORIOS = ("Datos", os.path.join("Datos", "pruebas"))
+DIRECTORIO_GOLDEN = os.path.join("Datos", "golden")
+EXTENSIONES = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff")
+
+# Variantes sintéticas de la primera página de cada documento
+VARIANTES = ("rotada", "desenfocada", "reducida", "jpeg")
+
+
+def listar_documentos(directorios=DIRECTORIOS):
+    """
+    Retorna las rutas de los documentos soportados de los directorios, sin recorrer subdirectorios.
+    """
+    documentos = []
+    for directorio in directorios:
+        if not os.path.isdir(directorio):
+            continue
+        for nombre in sorted(os.listdir(directorio)):
+            ruta = os.path.join(directorio, nombre)
+            if os.path.isfile(ruta) and nombre.lower().endswith(EXTENSIONES):
+                documentos.append(ruta)
+    return documentos
+
+
+def ruta_golden(documento):
+    """
+    Ruta del texto de referencia de un documento (una entrada por página).
+    """
+    relativa = os.path.relpath(documento, "Datos")
+    return os.path.join(DIRECTORIO_GOLDEN, relativa + ".json")
+
+
+def cargar_golden(documento):
+    ruta = ruta_golden(documento)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def generar_golden(documentos):
+    """
+    Guarda el texto de referencia de cada documento que todavía no lo tiene.
+    """
+    perfil_original = OCR["perfil"]
+    OCR["perfil"] = "preciso"
+    try:
+        for documento in documentos:
+            ruta = ruta_golden(documento)
+            if os.path.exists(ruta):
+                continue
+            paginas = [p["texto"] for p in iterar_texto_paginas(documento, usar_capa_texto=True)]
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with open(ruta, "w", encoding="utf-8") as f:
+                json.dump(paginas, f, ensure_ascii=False, indent=1)
+            print(f"golden: {ruta}", file=sys.stderr)
+    finally:
+        OCR["perfil"] = perfil_original
+
+
+def crear_variante(imagen, variante):
+    """
+    Aplica una degradación sintética a una página (BGR) para simular fotos y escaneos malos.
+    """
+    alto, ancho = imagen.shape[:2]
+    if variante == "rotada":
+        matriz = cv2.getRotationMatrix2D((ancho / 2, alto / 2), 3, 1.0)
+        return cv2.warpAffine(imagen, matriz, (ancho, alto), borderValue=(255, 255, 255))
+    if variante == "desenfocada":
+        return cv2.GaussianBlur(imagen, (5, 5), 1.5)
+    if variante == "reducida":
+        return cv2.resize(imagen, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+    if variante == "jpeg":
+        _, datos = cv2.imencode(".jpg", imagen, [cv2.IMWRITE_JPEG_QUALITY, 30])
+        return cv2.imdecode(datos, cv2.IMREAD_COLOR)
+    raise ValueError(f"Variante no soportada: {variante}")
+
+
+def generar_variantes(documentos, directorio):
+    """
+    Escribe en `directorio` las variantes sintéticas de la primera página de cada
+    documento que tiene texto de referencia.
+
+    Retorna:
+    list: Tuplas (ruta de la variante, nombre, textos de referencia).
+    """
+    variantes = []
+    for documento in documentos:
+        golden = cargar_golden(documento)
+        if not golden:
+            continue
+        paginas = PaginasDocumento(documento, max_en_memoria=1)
+        imagen = paginas.pagina(0)
+        if imagen is None:
+            continue
+        base = os.path.splitext(os.path.basename(documento))[0]
+        for variante in VARIANTES:
+            ruta = os.path.join(directorio, f"{base}__{variante}.png")
+            cv2.imwrite(ruta, crear_variante(imagen, variante))
+            variantes.append((ruta, f"{documento}#{variante}", golden[:1]))
+        paginas.liberar()
+    return variantes
+
+
+def distancia_edicion(a, b):
+    """
+    Distancia de Levenshtein entre dos cadenas. Cada fila de la tabla se calcula
+    con operaciones vectorizadas: la inserción es un mínimo acumulado.
+    """
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+    b_codigos = np.frombuffer(b.encode("utf-32-le"), dtype=np.uint32)
+    indices = np.arange(len(b) + 1)
+    fila = indices.copy()
+    for i, caracter in enumerate(a, start=1):
+        costo = (b_codigos != ord(caracter)).astype(np.int64)
+        candidatos = np.empty(len(b) + 1, dtype=np.int64)
+        candidatos[0] = i
+        candidatos[1:] = np.minimum(fila[1:] + 1, fila[:-1] + costo)
+        fila = indices + np.minimum.accumulate(candidatos - indices)
+    return int(fila[-1])
+
+
+def precision_caracteres(texto, referencia):
+    """
+    1 - CER: proporción de caracteres correctos respecto al texto de referencia,
+    sin tener en cuenta diferencias de espacios y saltos de línea.
+    """
+    texto = " ".join(texto.split())
+    referencia = " ".join(referencia.split())
+    if not referencia:
+        return None
+    return max(0.0, 1 - distancia_edicion(texto, referencia) / len(referencia))
+
+
+class MedidorRSS:
+    """
+    Muestrea en segundo plano la memoria residente del proceso y de sus hijos
+    (los procesos del pool de OCR) y conserva el pico.
+    """
+
+    def __init__(self, intervalo=0.05):
+        self.intervalo = intervalo
+        self.pico = 0
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _muestrear(self):
+        proceso = psutil.Process()
+        while not self._detener.is_set():
+            try:
+                rss = proceso.memory_info().rss
+                for hijo in proceso.children(recursive=True):
+                    rss += hijo.memory_info().rss
+            except psutil.Error:
+                rss = 0
+            self.pico = max(self.pico, rss)
+            self._detener.wait(self.intervalo)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+
+
+def medir_documento(ruta, golden, usar_capa_texto):
+    """
+    Extrae el texto de un documento y mide la latencia de cada página (tiempo
+    entre la entrega de una página y la siguiente) y la precisión por página.
+    """
+    latencias = []
+    precisiones = []
+    metodos = []
+    inicio = anterior = time.perf_counter()
+    for pagina in iterar_texto_paginas(ruta, usar_capa_texto=usar_capa_texto):
+        ahora = time.perf_counter()
+        latencias.append(ahora - anterior)
+        anterior = ahora
+        metodos.append(pagina["metodo"])
+        indice = pagina["pagina"] - 1
+        if golden and indice < len(golden):
+            precision = precision_caracteres(pagina["texto"], golden[indice])
+            if precision is not None:
+                precisiones.append(precision)
+    return {
+        "paginas": len(latencias),
+        "segundos": time.perf_counter() - inicio,
+        "latencias": latencias,
+        "precision_caracteres": float(np.mean(precisiones)) if precisiones else None,
+        "metodos": sorted(set(metodos))
+    }
+
+
+def percentiles_ms(latencias):
+    if not latencias:
+        return None, None
+    p50, p95 = np.percentile(np.asarray(latencias) * 1000, [50, 95])
+    return round(float(p50), 1), round(float(p95), 1)
+
+
+def ejecutar_combinacion(documentos, motor, perfil, modo, usar_capa_texto, salida):
+    """
+    Corre todos los documentos con una combinación de motor/perfil/modo y escribe
+    una línea por documento y la línea de resumen.
+    """
+    OCR.update({"motor": motor, "perfil": perfil, "modo_ocr": modo})
+    # El pool carga el motor al iniciar sus procesos: se recrea en cada combinación
+    motores_ocr.cerrar_pool()
+    combinacion = {"motor": motor, "perfil": perfil, "modo_ocr": modo}
+    latencias = []
+    precisiones = []
+    paginas = 0
+    errores = 0
+    with MedidorRSS() as medidor:
+        inicio = time.perf_counter()
+        for ruta, nombre, golden in documentos:
+            try:
+                medida = medir_documento(ruta, golden, usar_capa_texto)
+            except Exception as e:
+                errores += 1
+                escribir(salida, {"tipo": "documento", **combinacion, "documento": nombre, "error": str(e)})
+                continue
+            p50, p95 = percentiles_ms(medida["latencias"])
+            escribir(salida, {
+                "tipo": "documento", **combinacion, "documento": nombre,
+                "paginas": medida["paginas"], "segundos": round(medida["segundos"], 3),
+                "latencia_p50_ms": p50, "latencia_p95_ms": p95,
+                "precision_caracteres": medida["precision_caracteres"],
+                "metodos": medida["metodos"]
+            })
+            paginas += medida["paginas"]
+            latencias.extend(medida["latencias"])
+            if medida["precision_caracteres"] is not None:
+                precisiones.append(medida["precision_caracteres"])
+        segundos = time.perf_counter() - inicio
+    motores_ocr.cerrar_pool()
+
+    p50, p95 = percentiles_ms(latencias)
+    resumen = {
+        "tipo": "resumen", **combinacion,
+        "documentos": len(documentos), "errores": errores, "paginas": paginas,
+        "segundos": round(segundos, 3),
+        "paginas_por_segundo": round(paginas / segundos, 3) if segundos else None,
+        "latencia_p50_ms": p50, "latencia_p95_ms": p95,
+        "rss_pico_mb": round(medidor.pico / 2**20, 1),
+        "precision_caracteres": round(float(np.mean(precisiones)), 4) if precisiones else None
+    }
+    escribir(salida, resumen)
+    return resumen
+
+
+def escribir(salida, registro):
+    salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    salida.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del OCR sobre Datos/")
+    parser.add_argument("--motores", nargs="+", default=[motores_ocr.motor_configurado()], choices=motores_ocr.MOTORES)
+    parser.add_argument("--perfiles", nargs="+", default=[OCR["perfil"]])
+    parser.add_argument("--modos", nargs="+", default=[OCR["modo_ocr"]], choices=("pagina", "regiones"))
+    parser.add_argument("--documentos", nargs="+", help="Documentos a medir (por defecto Datos/ y Datos/pruebas/)")
+    parser.add_argument("--sin-variantes", action="store_true", help="No generar variantes sintéticas")
+    parser.add_argument("--con-capa-texto", action="store_true",
+                        help="Leer la capa de texto de los PDF en vez de forzar OCR en todas las páginas")
+    parser.add_argument("--generar-golden", action="store_true",
+                        help="Guardar el texto de referencia de los documentos que no lo tienen")
+    parser.add_argument("--salida", help="Archivo JSON lines de salida (por defecto la salida estándar)")
+    args = parser.parse_args()
+
+    rutas = args.documentos or listar_documentos()
+    if args.generar_golden:
+        generar_golden(rutas)
+        return
+
+    documentos = [(ruta, ruta, cargar_golden(ruta)) for ruta in rutas]
+    salida = open(args.salida, "w", encoding="utf-8") if args.salida else sys.stdout
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            if not args.sin_variantes:
+                documentos += generar_variantes(rutas, directorio)
+            for motor, perfil, modo in product(args.motores, args.perfiles, args.modos):
+                resumen = ejecutar_combinacion(documentos, motor, perfil, modo, args.con_capa_texto, salida)
+                print(
+                    f"{motor}/{perfil}/{modo}: {resumen['paginas_por_segundo']} pág/s, "
+                    f"p95 {resumen['latencia_p95_ms']} ms, precisión {resumen['precision_caracteres']}",
+                    file=sys.stderr
+                )
+    finally:
+        if salida is not sys.stdout:
+            salida.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,13 +22,16 @@ st.write(f"Bienvenida, {st.session_state['usuario']} 👋")
 import streamlit as st
 import os
 import pandas as pd
+from itertools import islice
 from PIL import Image
 
 # Importar servicios modularizados
 from services.modelos import obtener_modelo_ia
-from services.extraccion import extraer_texto, extraer_datos_carta_laboral, extraer_datos_extracto_bancario, extraer_datos_colilla_pago
+from services.extraccion import iterar_texto_por_pagina, layouts_de_paginas, campos_baja_confianza, extraer_datos_carta_laboral, extraer_datos_extracto_bancario, extraer_datos_colilla_pago
 from services.comparacion import comparar_documentos
 from services.visual import analizar_documento_visual
+from libreria.paginas_documento import PaginasDocumento
+from libreria.config import OCR
 from services.metadatos import extraer_metadatos
 from services.reporte import generar_pdf_report
 from services.utilidades import formatear_valor_monetario
@@ -242,24 +245,39 @@ if uploaded_files:
         with open(path, "wb") as f:
             f.write(archivo.getbuffer())
 
-        # Análisis de texto y visual
-        texto = extraer_texto(path)
-        tipo = modelo.clasificar_documento(texto)
-        analisis_visual = analizar_documento_visual(path)
+        # Análisis de texto y visual sobre las mismas páginas rasterizadas.
+        # Para clasificar basta con las primeras páginas; el resto del texto
+        # solo se extrae si el documento es de un tipo que se va a comparar.
+        paginas = PaginasDocumento(path)
+        paginas_texto = iterar_texto_por_pagina(path, paginas)
+        resultado_paginas = list(islice(paginas_texto, OCR["paginas_clasificacion"]))
+        tipo = modelo.clasificar_documento("".join(p["texto"] for p in resultado_paginas))
+        if tipo != "otro":
+            resultado_paginas.extend(paginas_texto)
+        paginas_texto.close()
+        texto = "".join(p["texto"] for p in resultado_paginas)
+        layouts = layouts_de_paginas(resultado_paginas)
+        analisis_visual = analizar_documento_visual(path, paginas, layouts, tipo)
+        paginas.liberar()
         metadatos = extraer_metadatos(path)
         
         # Extraer datos según el tipo de documento
         datos_documento = {}
         if tipo == "extracto bancario":
-            datos_documento = extraer_datos_extracto_bancario(modelo, texto)
+            datos_documento = extraer_datos_extracto_bancario(modelo, texto, layouts)
             print("Datos del extracto bancario:", datos_documento)
         elif tipo == "colilla de pago":
-            datos_documento = extraer_datos_colilla_pago(modelo, texto)
+            datos_documento = extraer_datos_colilla_pago(modelo, texto, layouts)
             print("Datos de la colilla de pago:", datos_documento)
+
+        campos_dudosos = campos_baja_confianza(datos_documento)
+        if campos_dudosos:
+            st.warning(f"{archivo.name}: valores leídos con baja confianza de OCR: {', '.join(campos_dudosos)}")
         
         documentos_clasificados[tipo].append({
             "nombre_archivo": archivo.name,
             "texto": texto,
+            "layouts": layouts,
             "path": path,
             "analisis_visual": analisis_visual,
             "metadatos": metadatos,
@@ -329,8 +347,11 @@ if uploaded_files:
         
         # Extraer datos de la carta laboral
         carta = documentos_clasificados["carta laboral"][0]
-        datos_carta = extraer_datos_carta_laboral(modelo, carta["texto"])
+        datos_carta = extraer_datos_carta_laboral(modelo, carta["texto"], carta["layouts"])
         print("Datos carta laboral:", datos_carta)
+        campos_dudosos = campos_baja_confianza(datos_carta)
+        if campos_dudosos:
+            st.warning(f"{carta['nombre_archivo']}: valores leídos con baja confianza de OCR: {', '.join(campos_dudosos)}")
 
         if "error" not in datos_carta:
             # Crear columnas para mostrar la información
@@ -2,21 +2,141 @@
 """
 Módulo para la extracción de texto y datos de documentos.
 """
-from libreria.extraction_texto import extraccion_texto
+import re
+
+from libreria.extraction_texto import iterar_texto_paginas, parametros_ocr
+from libreria.cache_ocr import CacheOCR
+from libreria.layout_ocr import LayoutOCR
+from libreria.config import OCR
 from libreria.modelos_ia import ModeloIA
 
+# Caché compartida por todas las sesiones del proceso
+cache_ocr = CacheOCR() if OCR["usar_cache"] else None
+
 # TODO: Recibir el modelo como parámetro o inyectar dependencia
 
-def extraer_texto(file_path):
-    return extraccion_texto(file_path)
+def iterar_texto_por_pagina(file_path, paginas=None):
+    """
+    Entrega el texto del documento página por página. Si el documento ya está en
+    la caché se sirve desde ahí; si no, las páginas se extraen a medida que se
+    piden. Las páginas leídas se guardan en la caché aunque no se recorra el
+    documento completo (por ejemplo, cuando solo se leyeron las páginas para
+    clasificarlo): la entrada queda marcada como incompleta y la próxima vez se
+    sirven esas páginas y la extracción sigue desde la siguiente.
+    """
+    if cache_ocr is None:
+        yield from iterar_texto_paginas(file_path, paginas=paginas)
+        return
+    clave = cache_ocr.clave(file_path, parametros_ocr())
+    en_cache = cache_ocr.obtener(clave) or {"paginas": [], "completo": False}
+    if isinstance(en_cache, list):
+        # Entradas del formato anterior: solo se guardaban documentos completos
+        en_cache = {"paginas": en_cache, "completo": True}
+    guardadas = en_cache["paginas"]
+    if en_cache["completo"]:
+        yield from guardadas
+        return
+    resultado = list(guardadas)
+    completo = False
+    try:
+        yield from guardadas
+        for pagina in iterar_texto_paginas(file_path, paginas=paginas, desde=len(guardadas) + 1):
+            resultado.append(pagina)
+            yield pagina
+        completo = True
+    finally:
+        if completo or len(resultado) > len(guardadas):
+            cache_ocr.guardar(clave, {"paginas": resultado, "completo": completo})
+
+def extraer_texto(file_path, paginas=None):
+    return "".join(pagina["texto"] for pagina in iterar_texto_por_pagina(file_path, paginas))
+
+def layouts_de_paginas(paginas_texto):
+    """
+    Convierte el resultado por página en objetos LayoutOCR (None en las páginas
+    que se leyeron de la capa de texto y no pasaron por OCR).
+    """
+    return [LayoutOCR.desde_dict(p["layout"]) if p.get("layout") else None for p in paginas_texto]
+
+def _digitos(valor):
+    """
+    Dígitos de un valor numérico sin la parte decimal de dos cifras ("1.234,00" y
+    1234.0 quedan como "1234"), para compararlo con las palabras del OCR.
+    """
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return re.sub(r"\D", "", re.sub(r"[.,]\d{2}$", "", str(valor).strip()))
+
+def _valores_numericos(datos, prefijo=""):
+    """
+    Recorre el resultado del modelo (diccionarios y listas anidados) y entrega
+    (campo, dígitos) de los valores con al menos OCR["min_digitos_valor"] dígitos.
+    """
+    if isinstance(datos, dict):
+        elementos = ((f"{prefijo}.{k}" if prefijo else str(k), v) for k, v in datos.items())
+    elif isinstance(datos, list):
+        elementos = ((f"{prefijo}[{i}]", v) for i, v in enumerate(datos))
+    else:
+        if isinstance(datos, (str, int, float)) and not isinstance(datos, bool):
+            digitos = _digitos(datos)
+            if len(digitos) >= OCR["min_digitos_valor"]:
+                yield prefijo, digitos
+        return
+    for campo, valor in elementos:
+        yield from _valores_numericos(valor, campo)
+
+def confianza_valores(datos, layouts):
+    """
+    Confianza del OCR de cada valor numérico que extrajo el modelo: se buscan sus
+    dígitos en las palabras de los layouts y se toma la menor confianza de las
+    palabras que coinciden. Los valores que no aparecen en ningún layout (páginas
+    leídas de la capa de texto o valores que el modelo reescribió) se omiten.
+
+    Parámetros:
+    datos (dict): Datos extraídos por el modelo.
+    layouts (list): LayoutOCR de cada página (None en las páginas sin OCR).
+
+    Retorna:
+    dict: Confianza (0-100) por campo, con la ruta del campo como clave.
+    """
+    confianza_por_digitos = {}
+    for layout in layouts:
+        if layout is None:
+            continue
+        for palabra, confianza in zip(layout.palabras, layout.confianzas):
+            digitos = _digitos(palabra)
+            if len(digitos) >= OCR["min_digitos_valor"]:
+                anterior = confianza_por_digitos.get(digitos, float("inf"))
+                confianza_por_digitos[digitos] = min(anterior, float(confianza))
+    return {
+        campo: confianza_por_digitos[digitos]
+        for campo, digitos in _valores_numericos(datos)
+        if digitos in confianza_por_digitos
+    }
+
+def campos_baja_confianza(datos):
+    """
+    Campos cuyo valor se leyó con una confianza de OCR menor a
+    OCR["confianza_min_valores"]; conviene revisarlos a mano.
+    """
+    confianzas = datos.get("confianza_ocr", {}) if isinstance(datos, dict) else {}
+    return [campo for campo, confianza in confianzas.items() if confianza < OCR["confianza_min_valores"]]
+
+def _con_confianza(datos, layouts):
+    if layouts and isinstance(datos, dict) and datos:
+        datos["confianza_ocr"] = confianza_valores(datos, layouts)
+    return datos
 
 # TODO: Esta función asume que el modelo es global, mejorar para inyectar modelo
 
-def extraer_datos_carta_laboral(modelo, texto):
-    return modelo.extraer_datos_carta_laboral(texto)
+# Con los layouts del OCR, el resultado incluye "confianza_ocr": la confianza
+# con que se leyó cada valor numérico (ver confianza_valores)
+
+def extraer_datos_carta_laboral(modelo, texto, layouts=None):
+    return _con_confianza(modelo.extraer_datos_carta_laboral(texto), layouts)
 
-def extraer_datos_extracto_bancario(modelo, texto):
-    return modelo.extraer_datos_extracto_bancario(texto)
+def extraer_datos_extracto_bancario(modelo, texto, layouts=None):
+    return _con_confianza(modelo.extraer_datos_extracto_bancario(texto), layouts)
 
-def extraer_datos_colilla_pago(modelo, texto):
-    return modelo.extraer_datos_colilla_pago(texto) 
\ No newline at end of file
+def extraer_datos_colilla_pago(modelo, texto, layouts=None):
+    return _con_confianza(modelo.extraer_datos_colilla_pago(texto), layouts) 
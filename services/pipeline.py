@@ -1,6 +1,10 @@
+import os
+
 import pandas as pd
 import numpy as np
 
+from libreria.config import VISUAL
+
 def cargar_datos_desde_bd(query="SELECT * FROM TBL_IA_SOLICITUDES"):
         import sys
         sys.path.append('libreria')  # Agregamos la carpeta 'libreria' al path
@@ -57,6 +61,31 @@ def convertir_campos_numericos(df):
         return df
 
 
+def unir_variables_visuales(df, ruta_documentos=None):
+        """
+        Agrega a las solicitudes las variables del análisis visual por lotes
+        (archivo <salida>_documentos de analisis_visual_lote.py, Parquet o CSV;
+        por defecto VISUAL["variables_lote"]): nitidez_docs_min es la menor
+        nitidez entre los documentos de cada solicitud. Si el archivo no existe
+        las solicitudes quedan sin la variable y transformar_variables_credito
+        usa el valor por defecto.
+        """
+        ruta_documentos = ruta_documentos or VISUAL['variables_lote']
+        if not os.path.exists(ruta_documentos):
+            print(f"⚠️ No existe el archivo del análisis visual por lotes '{ruta_documentos}'.")
+            return df
+        if ruta_documentos.endswith('.parquet'):
+            documentos = pd.read_parquet(ruta_documentos)
+        else:
+            documentos = pd.read_csv(ruta_documentos, dtype={'solicitud': str})
+        documentos = documentos[documentos['error'].isna() & documentos['solicitud'].notna()]
+        nitidez = documentos.groupby('solicitud')['nitidez'].min().rename('nitidez_docs_min')
+        df = df.drop(columns=['nitidez_docs_min'], errors='ignore')
+        claves = df['SOLICITUD'].astype(str)
+        df['nitidez_docs_min'] = claves.map(nitidez.rename(index=str)).to_numpy()
+        return df
+
+
 def transformar_variables_credito(df):
 
         # Conteo negaciones por motivos específicos
@@ -82,7 +111,12 @@ def transformar_variables_credito(df):
                                                 np.where(df['SIMOCUP2']=='INDEP','INDEP','NA'))
         
         df['producer_docs'] = 'canva'
-        df['nitidez_docs_min'] = 100
+        # nitidez_docs_min viene del análisis visual (ver unir_variables_visuales);
+        # las solicitudes sin documentos analizados conservan el valor por defecto
+        if 'nitidez_docs_min' in df.columns:
+            df['nitidez_docs_min'] = df['nitidez_docs_min'].fillna(100)
+        else:
+            df['nitidez_docs_min'] = 100
         df['max_dias_docs'] = 30
 
         # Rellenar columnas con 0 si hay NaN
@@ -322,6 +356,7 @@ from sklearn.preprocessing import FunctionTransformer
 
 preprocesamiento = Pipeline([
         ('buscar_solicitud', FunctionTransformer(buscar_solicitud)),
+        ('unir_variables_visuales', FunctionTransformer(unir_variables_visuales)),
         ('convertir_campos_numericos', FunctionTransformer(convertir_campos_numericos)),
         ('transformar_variables_credito', FunctionTransformer(transformar_variables_credito)),
         ('clasificar_motivo_negacion_anterior_exactos', FunctionTransformer(clasificar_motivo_negacion_anterior_exactos)),
@@ -12,6 +12,26 @@ from datetime import datetime
 
 # TODO: Permitir personalizar el formato del reporte y los estilos
 
+def resumen_calidad_ocr(documentos_clasificados):
+    """
+    Filas de la tabla de calidad del OCR: páginas que pasaron por OCR y la
+    confianza media de sus palabras, tomadas de los LayoutOCR del documento.
+    """
+    filas = [["Documento", "Páginas con OCR", "Confianza media"]]
+    for docs in documentos_clasificados.values():
+        for doc in docs:
+            layouts = [l for l in doc.get("layouts", []) if l is not None]
+            if not layouts:
+                continue
+            palabras = sum(len(l) for l in layouts)
+            confianza = sum(float(l.confianzas.sum()) for l in layouts) / palabras if palabras else 0
+            filas.append([
+                doc["nombre_archivo"],
+                f"{len(layouts)} de {len(doc['layouts'])}",
+                f"{confianza:.1f}%"
+            ])
+    return filas
+
 def generar_pdf_report(documentos_clasificados, resultados_comparaciones):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(
@@ -57,6 +77,19 @@ def generar_pdf_report(documentos_clasificados, resultados_comparaciones):
     ]))
     elements.append(t)
     elements.append(Spacer(1, 20))
+    calidad_ocr = resumen_calidad_ocr(documentos_clasificados)
+    if len(calidad_ocr) > 1:
+        elements.append(Paragraph("Calidad del OCR", heading_style))
+        t = Table(calidad_ocr, colWidths=[3*inch, 1.5*inch, 1.5*inch])
+        t.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ]))
+        elements.append(t)
+        elements.append(Spacer(1, 20))
     if resultados_comparaciones:
         elements.append(Paragraph("Resultados de Comparaciones", heading_style))
         for comparacion in resultados_comparaciones:
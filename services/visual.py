@@ -3,150 +3,318 @@
 Módulo para el análisis visual de documentos (PDF e imágenes).
 """
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import cv2
 import numpy as np
-from PIL import Image
-import pdf2image
-import tempfile
+
+from libreria.caracteristicas_pagina import CaracteristicasPagina
+from libreria.config import TIPOS_DOCUMENTOS, VISUAL
+from libreria.firmas_sellos import detectar_firmas_sellos
+from libreria.paginas_documento import PaginasDocumento
+
+# Sospechas del análisis visual: los resultados guardan los códigos y se
+# muestran con estos mensajes, en este orden
+SOSPECHAS_VISUALES = {
+    "sin_sellos": "No se detectaron sellos en el documento",
+    "sin_firmas": "No se detectaron firmas en el documento",
+    "calidad_baja": "La calidad de la imagen es baja",
+    "sin_marcas_agua": "No se detectaron marcas de agua"
+}
+
+_pool = None
+_pool_lock = threading.Lock()
 
 # TODO: Considerar separar la lógica de análisis de imágenes y PDF
 
-def convertir_pdf_a_imagen(pdf_path):
-    try:
-        temp_dir = tempfile.mkdtemp()
-        images = pdf2image.convert_from_path(pdf_path)
-        image_paths = []
-        for i, image in enumerate(images):
-            image_path = os.path.join(temp_dir, f'page_{i}.png')
-            image.save(image_path, 'PNG')
-            image_paths.append(image_path)
-        return image_paths
-    except Exception:
-        return []
-
-def analizar_documento_visual(archivo_path):
+def cargar_caracteristicas(imagen):
+    """
+    Retorna las CaracteristicasPagina de una página dada como ruta, arreglo BGR
+    o CaracteristicasPagina ya creadas. Retorna None si la imagen no se pudo cargar.
+    """
+    if imagen is None or isinstance(imagen, CaracteristicasPagina):
+        return imagen
+    img = imagen if isinstance(imagen, np.ndarray) else cv2.imread(imagen)
+    return CaracteristicasPagina(img) if img is not None else None
+
+def obtener_pool_visual():
+    """
+    Retorna el pool de hilos del análisis visual, creándolo la primera vez.
+
+    Lo comparten todas las sesiones, así varios documentos subidos a la vez no
+    lanzan más hilos que núcleos. Al crearlo se ajustan los hilos internos de
+    OpenCV para que pool x OpenCV no sobresuscriba los núcleos.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            nucleos = os.cpu_count() or 1
+            hilos = VISUAL["hilos"] or nucleos
+            cv2.setNumThreads(VISUAL["hilos_opencv"] or max(1, nucleos // hilos))
+            _pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="visual")
+        return _pool
+
+def requiere_analisis_completo(tipo):
+    """
+    Indica si el tipo de documento exige correr los detectores a resolución
+    completa en todas las páginas (ver TIPOS_DOCUMENTOS[tipo]["validaciones"]).
+    """
+    if not VISUAL["triaje"]:
+        return True
+    configuracion = TIPOS_DOCUMENTOS.get(tipo, {})
+    return configuracion.get("validaciones", {}).get("visual_completo", False)
+
+def analizar_pagina(paginas, indice, layouts, completo=True):
+    """
+    Analiza la página `indice` y mide sus etapas.
+
+    Retorna:
+    tuple: (resultado, segundos de rasterización, segundos de análisis).
+    """
+    layout = layouts[indice] if indice < len(layouts) else None
+    inicio = time.perf_counter()
+    caracteristicas = paginas.caracteristicas(indice)
+    rasterizada = time.perf_counter()
+    resultado = analizar_imagen(caracteristicas, layout, completo)
+    return resultado, rasterizada - inicio, time.perf_counter() - rasterizada
+
+def analizar_documento_visual(archivo_path, paginas=None, layouts=None, tipo=None, al_terminar_pagina=None):
+    """
+    Analiza visualmente el documento con las páginas en memoria, repartiendo las
+    páginas en el pool de hilos del análisis visual (OpenCV libera el GIL). Cada
+    página se incorpora al AcumuladorVisual apenas termina; el resultado no
+    depende del orden en que terminen.
+    Si se entrega `paginas` (PaginasDocumento) se usan las páginas ya rasterizadas;
+    si no, el documento se rasteriza aquí sin escribir imágenes en disco.
+    `layouts` es la lista de LayoutOCR por página que produjo la extracción de texto.
+    `tipo` es el tipo de documento clasificado: según TIPOS_DOCUMENTOS se analiza
+    a resolución completa o con el triaje sobre miniaturas (ver analizar_imagen).
+    `al_terminar_pagina(indice, resultado, segundos_render, segundos_analisis)`,
+    si se entrega, recibe el resultado de cada página apenas termina (lo usa el
+    análisis por lotes para escribir una fila por página).
+    """
+    completo = requiere_analisis_completo(tipo)
+    propias = paginas is None
     try:
-        es_pdf = archivo_path.lower().endswith('.pdf')
-        if es_pdf:
-            image_paths = convertir_pdf_a_imagen(archivo_path)
-            if not image_paths:
-                return {"error": "No se pudo convertir el PDF a imágenes"}
-            resultados_por_pagina = []
-            for img_path in image_paths:
-                resultado = analizar_imagen(img_path)
-                resultados_por_pagina.append(resultado)
-            resultado_final = combinar_resultados(resultados_por_pagina)
-            for img_path in image_paths:
-                try:
-                    os.remove(img_path)
-                except Exception:
-                    pass
-            return resultado_final
+        if propias:
+            paginas = PaginasDocumento(archivo_path)
+        layouts = layouts or []
+        acumulador = AcumuladorVisual()
+
+        def incorporar(indice, resultado, segundos_render, segundos_analisis):
+            acumulador.agregar(resultado, indice)
+            if al_terminar_pagina is not None:
+                al_terminar_pagina(indice, resultado, segundos_render, segundos_analisis)
+
+        if len(paginas) == 1:
+            incorporar(0, *analizar_pagina(paginas, 0, layouts, completo))
         else:
-            return analizar_imagen(archivo_path)
+            pool = obtener_pool_visual()
+            futuros = {
+                pool.submit(analizar_pagina, paginas, i, layouts, completo): i
+                for i in range(len(paginas))
+            }
+            # Cada página se incorpora apenas termina y su futuro se suelta, así
+            # el resultado de la página no queda retenido hasta el final
+            for futuro in as_completed(list(futuros)):
+                incorporar(futuros.pop(futuro), *futuro.result())
+        if not acumulador.paginas and not acumulador.errores:
+            return {"error": "No se pudo convertir el PDF a imágenes"}
+        return acumulador.resultado()
     except Exception as e:
         return {"error": f"Error en el análisis visual: {str(e)}"}
+    finally:
+        if propias and paginas is not None:
+            paginas.liberar()
+
+def detectar_elementos(pagina, escala=1.0, layout=None):
+    """
+    Corre los detectores de sellos, firmas y marcas de agua sobre una página.
+    Firmas y sellos se buscan solo en las regiones probables y se validan contra
+    el índice de plantillas (ver detectar_firmas_sellos).
+    Con `escala` < 1 la página es una miniatura: los umbrales de tamaño se escalan
+    (longitudes por escala, áreas por escala²) y las cajas de las firmas, un
+    arreglo (N, 4) int32, se devuelven en coordenadas de la página completa.
+    """
+    area = escala * escala
+    areas = pagina.componentes_adaptativo.areas
+    firmas_sellos = detectar_firmas_sellos(pagina, layout, escala)
+    return {
+        "numero_sellos": len(firmas_sellos["sellos"]),
+        "firmas_detectadas": firmas_sellos["firmas"],
+        "marcas_agua": int(np.count_nonzero((areas > 500 * area) & (areas < 5000 * area)))
+    }
+
+def analizar_imagen(imagen_path, layout=None, completo=True):
+    """
+    Analiza una página. Acepta la ruta de la imagen, la imagen ya decodificada (BGR)
+    o sus CaracteristicasPagina, que se comparten con los demás análisis de la página.
+    Si se entrega el LayoutOCR de la página, se reporta también la confianza del OCR.
 
-def analizar_imagen(imagen_path):
+    Con completo=False se hace primero un triaje sobre una miniatura de la página y
+    los detectores a resolución completa solo se corren si el triaje encuentra una
+    anomalía (ver requiere_escalar). El resultado tiene el mismo formato en ambos casos; "nivel" indica
+    con qué resolución se obtuvo ("miniatura" o "completo").
+    """
     try:
-        img = cv2.imread(imagen_path)
-        if img is None:
+        caracteristicas = cargar_caracteristicas(imagen_path)
+        if caracteristicas is None:
             return {"error": "No se pudo cargar la imagen"}
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        def detectar_sellos(imagen):
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY_INV, 11, 2
-            )
-            contours, _ = cv2.findContours(
-                thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-            )
-            sellos = []
-            for cnt in contours:
-                area = cv2.contourArea(cnt)
-                if 1000 < area < 10000:
-                    sellos.append(cnt)
-            return len(sellos)
-        def detectar_firmas(imagen):
-            _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV)
-            contours, _ = cv2.findContours(
-                binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-            )
-            firmas = []
-            for cnt in contours:
-                x, y, w, h = cv2.boundingRect(cnt)
-                if w > 50 and h > 20:
-                    firmas.append((x, y, w, h))
-            return firmas
-        def analizar_calidad(imagen):
-            laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-            sharpness = np.var(laplacian)
-            contrast = np.std(gray)
-            return {
-                "nitidez": sharpness,
-                "contraste": contrast
-            }
-        def detectar_marcas_agua(imagen):
-            if len(imagen.shape) == 3:
-                gray_local = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
-            else:
-                gray_local = imagen
-            thresh = cv2.adaptiveThreshold(
-                gray_local, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY_INV, 11, 2
-            )
-            contours, _ = cv2.findContours(
-                thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-            )
-            marcas_agua = []
-            for cnt in contours:
-                area = cv2.contourArea(cnt)
-                if 500 < area < 5000:
-                    marcas_agua.append(cnt)
-            return len(marcas_agua)
-        resultados = {
-            "numero_sellos": detectar_sellos(img),
-            "firmas_detectadas": detectar_firmas(img),
-            "calidad": analizar_calidad(img),
-            "marcas_agua": detectar_marcas_agua(img),
-            "sospechas": []
+        # La nitidez (varianza del laplaciano) depende de la resolución, así que se
+        # mide siempre sobre la página completa para que el umbral y el valor
+        # reportado signifiquen lo mismo en los dos niveles
+        calidad = {
+            "nitidez": caracteristicas.nitidez,
+            "contraste": caracteristicas.contraste
         }
-        if resultados["numero_sellos"] == 0:
-            resultados["sospechas"].append("No se detectaron sellos en el documento")
-        if len(resultados["firmas_detectadas"]) == 0:
-            resultados["sospechas"].append("No se detectaron firmas en el documento")
-        if resultados["calidad"]["nitidez"] < 100:
-            resultados["sospechas"].append("La calidad de la imagen es baja")
-        if resultados["marcas_agua"] == 0:
-            resultados["sospechas"].append("No se detectaron marcas de agua")
-        return resultados
+        if layout is not None and layout.confianza_media() is not None:
+            calidad["confianza_ocr"] = layout.confianza_media()
+
+        if not completo:
+            miniatura, escala = caracteristicas.miniatura(VISUAL["lado_miniatura"])
+            if escala < 1:
+                resultados = armar_resultado(detectar_elementos(miniatura, escala, layout), calidad, "miniatura")
+                if not requiere_escalar(resultados, miniatura):
+                    return resultados
+        return armar_resultado(detectar_elementos(caracteristicas, layout=layout), calidad, "completo")
     except Exception as e:
         return {"error": f"Error en el análisis visual: {str(e)}"}
 
-def combinar_resultados(resultados_por_pagina):
-    resultado_final = {
-        "numero_sellos": 0,
-        "firmas_detectadas": [],
-        "calidad": {
-            "nitidez": 0,
-            "contraste": 0
-        },
-        "marcas_agua": 0,
-        "sospechas": []
+def rango_tonal(gris):
+    """
+    Diferencia entre los percentiles 1 y 99 de los niveles de gris: la distancia
+    entre la tinta y el papel. A diferencia de la desviación estándar, no baja
+    en una página limpia con poco texto.
+    """
+    acumulado = np.cumsum(cv2.calcHist([gris], [0], None, [256], [0, 256]).ravel())
+    oscuro, claro = np.searchsorted(acumulado, [0.01 * acumulado[-1], 0.99 * acumulado[-1]])
+    return int(claro) - int(oscuro)
+
+def requiere_escalar(resultado, miniatura):
+    """
+    Indica si el resultado del triaje sobre la miniatura pide repetir el análisis
+    a resolución completa: nitidez bajo el mínimo, poca diferencia entre tinta y
+    papel (ver rango_tonal), o candidatos a firma o sello que hay que confirmar
+    con más detalle. La ausencia de sellos, firmas o marcas de agua no escala:
+    es lo normal en un extracto limpio y la resolución completa no la cambiaría.
+    """
+    return (
+        resultado["calidad"]["nitidez"] < VISUAL["nitidez_min"]
+        or rango_tonal(miniatura.gris) < VISUAL["rango_tonal_min"]
+        or resultado["numero_sellos"] > 0
+        or len(resultado["firmas_detectadas"]) > 0
+    )
+
+def codigos_sospecha(resultado):
+    """
+    Códigos (ver SOSPECHAS_VISUALES) de las sospechas de una página.
+    """
+    codigos = []
+    if resultado["numero_sellos"] == 0:
+        codigos.append("sin_sellos")
+    if len(resultado["firmas_detectadas"]) == 0:
+        codigos.append("sin_firmas")
+    if resultado["calidad"]["nitidez"] < VISUAL["nitidez_min"]:
+        codigos.append("calidad_baja")
+    if resultado["marcas_agua"] == 0:
+        codigos.append("sin_marcas_agua")
+    return codigos
+
+def armar_resultado(elementos, calidad, nivel):
+    """
+    Arma el resultado de una página en el formato que muestra main.py y agrega las sospechas.
+    """
+    resultados = {
+        **elementos,
+        "calidad": dict(calidad),
+        "nivel": nivel
     }
-    for resultado in resultados_por_pagina:
+    resultados["codigos_sospecha"] = codigos_sospecha(resultados)
+    resultados["sospechas"] = [SOSPECHAS_VISUALES[c] for c in resultados["codigos_sospecha"]]
+    return resultados
+
+class AcumuladorVisual:
+    """
+    Combina los resultados de las páginas de un documento a medida que terminan,
+    sin guardar los resultados por página.
+
+    - Sellos y marcas de agua se suman; nitidez y contraste se quedan con el
+      máximo y la confianza del OCR con el mínimo.
+    - Las firmas se guardan como arreglos (N, 4) int32 y al final se entregan en
+      orden de página.
+    - Las sospechas se guardan como códigos sin repetir (ver SOSPECHAS_VISUALES).
+    - El nivel es "completo" si alguna página se analizó a resolución completa.
+
+    El resultado no depende del orden en que se agregan las páginas.
+    """
+
+    def __init__(self):
+        self.paginas = 0
+        self.errores = []
+        self.numero_sellos = 0
+        self.marcas_agua = 0
+        self.nitidez = 0
+        self.contraste = 0
+        self.confianza_ocr = None
+        self.codigos = set()
+        self.nivel = "miniatura"
+        self._firmas = []
+
+    def agregar(self, resultado, pagina=0):
+        """
+        Incorpora el resultado de la página `pagina` (numeradas desde 0).
+        """
         if "error" in resultado:
-            continue
-        resultado_final["numero_sellos"] += resultado["numero_sellos"]
-        resultado_final["firmas_detectadas"].extend(resultado["firmas_detectadas"])
-        resultado_final["calidad"]["nitidez"] = max(
-            resultado_final["calidad"]["nitidez"],
-            resultado["calidad"]["nitidez"]
-        )
-        resultado_final["calidad"]["contraste"] = max(
-            resultado_final["calidad"]["contraste"],
-            resultado["calidad"]["contraste"]
-        )
-        resultado_final["marcas_agua"] += resultado["marcas_agua"]
-        resultado_final["sospechas"].extend(resultado["sospechas"])
-    return resultado_final 
\ No newline at end of file
+            self.errores.append((pagina, resultado["error"]))
+            return
+        self.paginas += 1
+        self.numero_sellos += resultado["numero_sellos"]
+        self.marcas_agua += resultado["marcas_agua"]
+        self.nitidez = max(self.nitidez, resultado["calidad"]["nitidez"])
+        self.contraste = max(self.contraste, resultado["calidad"]["contraste"])
+        if "confianza_ocr" in resultado["calidad"]:
+            confianza = resultado["calidad"]["confianza_ocr"]
+            self.confianza_ocr = confianza if self.confianza_ocr is None else min(self.confianza_ocr, confianza)
+        self.codigos.update(resultado.get("codigos_sospecha", codigos_sospecha(resultado)))
+        if resultado.get("nivel", "completo") == "completo":
+            self.nivel = "completo"
+        firmas = np.asarray(resultado["firmas_detectadas"], dtype=np.int32).reshape(-1, 4)
+        if len(firmas):
+            self._firmas.append((pagina, firmas))
+
+    def firmas(self):
+        """
+        Cajas de las firmas de todas las páginas, arreglo (N, 4) int32 en orden de página.
+        """
+        if not self._firmas:
+            return np.zeros((0, 4), dtype=np.int32)
+        return np.concatenate([firmas for _, firmas in sorted(self._firmas, key=lambda f: f[0])])
+
+    def resultado(self):
+        """
+        Resultado combinado en el formato que muestra main.py. Si ninguna página
+        se pudo analizar, se retorna el error de la primera.
+        """
+        if not self.paginas and self.errores:
+            return {"error": min(self.errores)[1]}
+        codigos = [c for c in SOSPECHAS_VISUALES if c in self.codigos]
+        calidad = {"nitidez": self.nitidez, "contraste": self.contraste}
+        if self.confianza_ocr is not None:
+            calidad["confianza_ocr"] = self.confianza_ocr
+        return {
+            "numero_sellos": self.numero_sellos,
+            "firmas_detectadas": self.firmas(),
+            "calidad": calidad,
+            "marcas_agua": self.marcas_agua,
+            "codigos_sospecha": codigos,
+            "sospechas": [SOSPECHAS_VISUALES[c] for c in codigos],
+            "nivel": self.nivel
+        }
+
+def combinar_resultados(resultados_por_pagina):
+    acumulador = AcumuladorVisual()
+    for pagina, resultado in enumerate(resultados_por_pagina):
+        acumulador.agregar(resultado, pagina)
+    return acumulador.resultado()